@@ -0,0 +1,490 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed
+    ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_size SET total = total + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update
+AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_size SET total = total + new.size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_size SET total = total - old.size;
+END;
+'''
+
+UPSERT = '''
+INSERT INTO cache_entries (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    accessed = excluded.accessed, size = excluded.size
+'''
+
+# Как часто обновлять время обращения при чтении: чаще — лишняя запись
+# на каждый get, а точность LRU до секунды не нужна.
+ACCESS_RESOLUTION = 1.0
+# Сколько ждать занятую базу: запись ждёт долго, а отметка чтения
+# не ждёт почти совсем — без неё теряется лишь точность LRU.
+BUSY_TIMEOUT = 30
+TOUCH_TIMEOUT = 0.05
+# Старые сборки SQLite принимают не больше 999 параметров в запросе.
+CHUNK_SIZE = 500
+
+
+def chunks(items):
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite в режиме WAL, общий для процессов хоста.
+
+    В отличие от LocMemCache сброс в одном воркере виден всем.
+    Размер ограничен ``OPTIONS['MAX_SIZE']`` байтами: сверх него
+    вытесняются просроченные, затем давно не читанные записи. Отметка
+    чтения ждёт занятую базу не дольше ``OPTIONS['TOUCH_TIMEOUT']``
+    секунд, а потом пропускается.
+    Целые числа хранятся как есть, и incr не распаковывает значение.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self.cull_fraction = float(options.get('CULL_FRACTION', 0.1))
+        self.touch_timeout = float(
+            options.get('TOUCH_TIMEOUT', TOUCH_TIMEOUT))
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def write(self):
+        """Транзакция, которая сразу берёт блокировку записи."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection.cursor()
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @staticmethod
+    def encode(key, value):
+        if type(value) is int:
+            return value, len(key) + 8
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return blob, len(key) + len(blob)
+
+    @staticmethod
+    def decode(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.key(key, version): key for key in keys}
+        now = time.time()
+        rows = []
+        for chunk in chunks(list(keys)):
+            rows.extend(self.connection.execute(
+                'SELECT key, value, accessed FROM cache_entries '
+                'WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'
+                .format(', '.join('?' * len(chunk))),
+                [*chunk, now]))
+        stale = [key for key, _, accessed in rows
+                 if now - accessed > ACCESS_RESOLUTION]
+        if stale:
+            self.mark_read(stale, now)
+        return {keys[key]: self.decode(value) for key, value, _ in rows}
+
+    def mark_read(self, keys, now):
+        """Обновляет время обращения, если база свободна.
+
+        Занятая база не повод задерживать чтение: LRU лишь неточен.
+        """
+        connection = self.connection
+        connection.execute(
+            f'PRAGMA busy_timeout = {int(self.touch_timeout * 1000)}')
+        try:
+            for chunk in chunks(keys):
+                connection.execute(
+                    'UPDATE cache_entries SET accessed = ? '
+                    'WHERE key IN ({})'.format(', '.join('?' * len(chunk))),
+                    [now, *chunk])
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.execute(
+                f'PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}')
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            key = self.key(key, version)
+            value, size = self.encode(key, value)
+            rows.append((key, value, expires, now, size))
+        with self.write() as cursor:
+            cursor.executemany(UPSERT, rows)
+            self.cull(cursor, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.key(key, version)
+        value, size = self.encode(key, value)
+        now = time.time()
+        with self.write() as cursor:
+            cursor.execute(
+                'DELETE FROM cache_entries WHERE key = ? AND expires <= ?',
+                [key, now])
+            cursor.execute(
+                'INSERT OR IGNORE INTO cache_entries '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [key, value, self.get_backend_timeout(timeout), now, size])
+            added = cursor.rowcount == 1
+            if added:
+                self.cull(cursor, now)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self.key(key, version)
+        with self.write() as cursor:
+            row = cursor.execute(
+                'SELECT value FROM cache_entries '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                [key, time.time()]).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            if not isinstance(row[0], int):
+                value = self.decode(row[0]) + delta
+                blob, size = self.encode(key, value)
+                cursor.execute(
+                    'UPDATE cache_entries SET value = ?, size = ? '
+                    'WHERE key = ?', [blob, size, key])
+                return value
+            cursor.execute(
+                'UPDATE cache_entries SET value = value + ? WHERE key = ?',
+                [delta, key])
+            return row[0] + delta
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.key(key, version)
+        cursor = self.connection.execute(
+            'UPDATE cache_entries SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, time.time()])
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.key(key, version)
+        return self.connection.execute(
+            'SELECT 1 FROM cache_entries '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [key, time.time()]).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.key(key, version) for key in keys]
+        for chunk in chunks(keys):
+            self.connection.execute(
+                'DELETE FROM cache_entries WHERE key IN ({})'.format(
+                    ', '.join('?' * len(chunk))), chunk)
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache_entries')
+
+    def size(self):
+        """Сколько байт сейчас занимают записи (ключи и значения)."""
+        return self.connection.execute(
+            'SELECT total FROM cache_size').fetchone()[0]
+
+    def cull(self, cursor, now):
+        """Вытесняет записи, когда кэш больше MAX_SIZE.
+
+        Сначала уходят просроченные, потом самые давно прочитанные —
+        с запасом в CULL_FRACTION, чтобы не чистить на каждой записи.
+        """
+        total = cursor.execute('SELECT total FROM cache_size').fetchone()[0]
+        if total <= self.max_size:
+            return
+        cursor.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', [now])
+        total = cursor.execute('SELECT total FROM cache_size').fetchone()[0]
+        excess = total - self.max_size * (1 - self.cull_fraction)
+        if excess > 0:
+            # Нарастающий итог по давности чтения: удаляем ровно столько
+            # старых записей, сколько нужно, чтобы освободить excess байт.
+            cursor.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, SUM(size) OVER (ORDER BY accessed, key)'
+                '   - size AS freed FROM cache_entries'
+                ' ) WHERE freed < ?)', [excess])
+
+    def close(self, **kwargs):
+        # Соединения живут всё время жизни потока: Django вызывает close
+        # после каждого запроса, а открывать базу заново дорого.
+        pass
+
+
+GENERATION_KEY = 'tiered:generation'
+MISSING = object()
+
+
+class Layer:
+    """L1 одного процесса: ограниченный LRU со сроком жизни записей."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.generation = None
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def remember(self, key, value, timeout=DEFAULT_TIMEOUT,
+                 generation=MISSING):
+        """Запоминает значение; с ``generation`` — только если за время
+        чтения из общего кэша L1 не сбрасывали."""
+        if timeout in (DEFAULT_TIMEOUT, None):
+            timeout = self.timeout
+        expires = time.monotonic() + min(timeout, self.timeout)
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if generation is not MISSING and generation != self.generation:
+                return
+            self.entries[key] = (expires, blob)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def forget(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(entry[1])
+
+    def reset(self, generation):
+        """Сбрасывает L1, если поколение сменилось; True, если сбросил."""
+        with self.lock:
+            if generation == self.generation:
+                return False
+            if self.entries:
+                self.counters['invalidations'] += 1
+            self.entries.clear()
+            self.generation = generation
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Django создаёт бэкенды кэша на каждый поток, а L1 должен быть общим
+# для процесса, иначе фоновые потоки не увидели бы сброса.
+_layers = {}
+_layers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """Кэш процесса (L1) перед общим кэшем из ``LOCATION``.
+
+    В L1 попадают только ключи с префиксами из ``OPTIONS['L1_PREFIXES']``:
+    мелкие горячие значения вроде версий страниц. Остальные ключи идут
+    прямо в общий кэш. Запись, удаление и incr ключа из L1 поднимают
+    счётчик поколений в общем кэше; CacheGenerationMiddleware сверяет
+    его в начале запроса и при расхождении сбрасывает L1, поэтому после
+    правки поста ни один воркер не отдаст старое значение из памяти.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.prefixes = tuple(options.get('L1_PREFIXES', ()))
+        with _layers_lock:
+            if location not in _layers:
+                _layers[location] = Layer(
+                    int(options.get('L1_SIZE', 1000)),
+                    float(options.get('L1_TIMEOUT', 60)))
+            self.l1 = _layers[location]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def stats(self):
+        """Попадания и промахи по уровням для этого процесса."""
+        with self.l1.lock:
+            return dict(self.l1.counters, l1_entries=len(self.l1.entries))
+
+    def sync(self):
+        """Сбрасывает L1, если другой процесс что-то поменял."""
+        self.l1.reset(self.shared.get(GENERATION_KEY))
+
+    def broadcast(self):
+        try:
+            generation = self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            # Начинаем со времени, чтобы не повторить прежнее поколение.
+            self.shared.add(GENERATION_KEY, time.time_ns(), None)
+            return
+        with self.l1.lock:
+            if (self.l1.generation is not None
+                    and generation == self.l1.generation + 1):
+                # Чужих изменений после нашей сверки не было: L1 верен.
+                self.l1.generation = generation
+
+    def local(self, key):
+        return key.startswith(self.prefixes)
+
+    def local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in filter(self.local, keys):
+            value = self.l1.lookup(self.local_key(key, version))
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.l1.count('l1_hits', len(found))
+        self.l1.count('l1_misses', len(missing))
+        missing.extend(key for key in keys if not self.local(key))
+        if missing:
+            # Сброс L1 другим потоком во время чтения делает прочитанное
+            # подозрительным: такое значение в L1 не кладём.
+            generation = self.l1.generation
+            shared = self.shared.get_many(missing, version=version)
+            self.l1.count('shared_hits', len(shared))
+            self.l1.count('shared_misses', len(missing) - len(shared))
+            for key, value in shared.items():
+                if self.local(key):
+                    self.l1.remember(
+                        self.local_key(key, version), value,
+                        generation=generation)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        if self.local(key):
+            # Даже новый в общем кэше ключ мог остаться в чужих L1,
+            # если общий кэш его вытеснил.
+            self.broadcast()
+            self.l1.remember(self.local_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added and self.local(key):
+            self.broadcast()
+            self.l1.remember(self.local_key(key, version), value, timeout)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version)
+        if self.local(key):
+            self.l1.forget(self.local_key(key, version))
+            self.broadcast()
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version)
+        local = [key for key in keys if self.local(key)]
+        if local:
+            self.l1.forget(*(self.local_key(key, version) for key in local))
+            self.broadcast()
+
+    def clear(self):
+        self.shared.clear()
+        self.l1.clear()
+        self.broadcast()
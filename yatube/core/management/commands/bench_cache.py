@@ -0,0 +1,95 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+
+
+def make_cache(name, directory):
+    location = {
+        'locmem': 'bench',
+        'file': os.path.join(directory, 'file'),
+        'sqlite': os.path.join(directory, 'cache.sqlite3'),
+    }[name]
+    return import_string(BACKENDS[name])(
+        location, {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': 10 ** 6}})
+
+
+def worker(name, directory, index, options, barrier, results):
+    """Заполняет свою долю ключей, затем читает и пишет вперемешку."""
+    cache = make_cache(name, directory)
+    rng = random.Random(options['seed'] + index)
+    value = 'x' * options['value_size']
+    processes = options['processes']
+    keys = [f'key_{i}' for i in range(options['keys'])]
+    cache.set_many({key: value for key in keys[index::processes]})
+    barrier.wait()
+    hits = reads = 0
+    started = time.perf_counter()
+    for _ in range(options['ops']):
+        key = rng.choice(keys)
+        if rng.random() < options['write_ratio']:
+            cache.set(key, value)
+        else:
+            reads += 1
+            hits += cache.get(key) is not None
+        if rng.random() < 0.01 and not cache.add('counter', 1):
+            cache.incr('counter')
+    results.put((time.perf_counter() - started, hits, reads))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает LocMemCache, FileBasedCache и core.cache.SQLiteCache '
+            'под нагрузкой из нескольких процессов: пропускная способность '
+            'и доля попаданий, когда ключи пишут разные воркеры')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', nargs='+', choices=sorted(BACKENDS),
+            default=['locmem', 'file', 'sqlite'])
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--ops', type=int, default=5000,
+                            help='Операций на процесс')
+        parser.add_argument('--value-size', type=int, default=2048)
+        parser.add_argument('--write-ratio', type=float, default=0.1)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        context = get_context('fork')
+        for name in options['backends']:
+            directory = tempfile.mkdtemp()
+            try:
+                barrier = context.Barrier(options['processes'])
+                results = context.Queue()
+                processes = [
+                    context.Process(
+                        target=worker,
+                        args=(name, directory, index, options, barrier,
+                              results))
+                    for index in range(options['processes'])
+                ]
+                for process in processes:
+                    process.start()
+                timings = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            elapsed = max(timing for timing, _, _ in timings)
+            hits = sum(hits for _, hits, _ in timings)
+            reads = sum(reads for _, _, reads in timings)
+            total = options['ops'] * options['processes']
+            self.stdout.write(
+                f'{name:>6}: {total / elapsed:,.0f} операций/с, '
+                f'попаданий {hits / max(reads, 1):.0%}')
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import replica_lag, replicas
+
+
+def copy_database(source, path):
+    """Копирует базу через backup API.
+
+    Читатели реплики видят её целиком старой или целиком новой,
+    а не файл на середине записи.
+    """
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную SQLite-базу в реплики из DATABASE_REPLICAS; '
+            'с --interval повторяет копирование, пока его не остановят')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Секунд между копиями; должно быть меньше REPLICA_LAG')
+
+    def handle(self, *args, **options):
+        if options['interval'] and options['interval'] >= replica_lag():
+            raise CommandError(
+                f'--interval должен быть меньше REPLICA_LAG '
+                f'({replica_lag()} с): иначе пользователь после записи '
+                f'может прочитать с реплики старые данные')
+        connection = connections[DEFAULT_DB_ALIAS]
+        while True:
+            connection.ensure_connection()
+            started = time.monotonic()
+            for alias in replicas():
+                copy_database(
+                    connection.connection,
+                    connections.databases[alias]['NAME'])
+            self.stdout.write(
+                f'Реплик обновлено: {len(replicas())} за '
+                f'{time.monotonic() - started:.2f} с')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
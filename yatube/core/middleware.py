@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from . import routers
+from .cache import TieredCache
+
+
+def tiered_caches():
+    return {
+        alias: caches[alias] for alias in settings.CACHES
+        if isinstance(caches[alias], TieredCache)
+    }
+
+
+class CacheGenerationMiddleware:
+    """В начале запроса сверяет поколения двухуровневых кэшей.
+
+    Один запрос к общему кэшу на алиас; если другой воркер что-то
+    перезаписал или удалил, L1 этого процесса сбрасывается.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for cache in tiered_caches().values():
+            cache.sync()
+        return self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """Ведёт состояние маршрутизатора реплик на время запроса.
+
+    Если запрос что-то записал, кука закрепляет пользователя за основной
+    базой на REPLICA_LAG секунд: он видит свои изменения, даже пока
+    реплики их ещё не получили.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = routers.begin(routers.STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            if routers.replicas() and routers.wrote():
+                response.set_cookie(
+                    routers.STICKY_COOKIE, '1',
+                    max_age=routers.replica_lag(), httponly=True,
+                    samesite='Lax')
+        finally:
+            routers.end(token)
+        return response
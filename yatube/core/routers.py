@@ -0,0 +1,119 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import available_attrs
+
+STICKY_COOKIE = 'primary'
+
+
+class ReplicaState:
+    """Что можно и что уже сделано с базой в рамках одного запроса."""
+
+    def __init__(self, sticky=False):
+        self.sticky = sticky
+        self.allowed = False
+        self.primary = False
+        self.wrote = False
+
+
+_state = ContextVar('replica_state', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def replica_lag():
+    return getattr(settings, 'REPLICA_LAG', 5)
+
+
+def begin(sticky=False):
+    """Заводит состояние маршрутизатора на время запроса."""
+    return _state.set(ReplicaState(sticky))
+
+
+def end(token):
+    _state.reset(token)
+
+
+def wrote():
+    """Писал ли текущий запрос в базу."""
+    state = _state.get()
+    return state is not None and state.wrote
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут на основную базу.
+
+    Для всего, что ляжет в кэш надолго: копия, собранная по отстающей
+    реплике уже после смены версии, осталась бы в кэше под новой
+    версией.
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    primary, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        state.primary = primary
+
+
+class ReplicaRouter:
+    """Чтения во вьюхах под read_from_replica — на случайную реплику.
+
+    Запись и остальные чтения — на основную базу. После записи запрос
+    до конца читает с основной, а ReplicaMiddleware закрепляет за ней
+    пользователя на REPLICA_LAG секунд.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        if (not state.allowed or state.primary or state.sticky
+                or state.wrote or not replicas()):
+            return DEFAULT_DB_ALIAS
+        alias = random.choice(replicas())
+        databases = connections.databases
+        if databases[alias]['NAME'] == databases[DEFAULT_DB_ALIAS]['NAME']:
+            # В тестах реплика — зеркало (TEST MIRROR) основной базы.
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики не мигрируют: это копии основной базы.
+        return db not in replicas()
+
+
+def read_from_replica(view_func):
+    """Разрешает GET-вьюхе читать с реплики."""
+    @wraps(view_func, assigned=available_attrs(view_func))
+    def _wrapped_view(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+        state.allowed = True
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            state.allowed = False
+    return _wrapped_view
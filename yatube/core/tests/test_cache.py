@@ -0,0 +1,197 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from multiprocessing import get_context
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from ..cache import GENERATION_KEY, SQLiteCache
+from ..middleware import CacheGenerationMiddleware
+
+TEMP_CACHE_DIR = tempfile.mkdtemp(dir=settings.TEST_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+
+def make_cache(name, **options):
+    return SQLiteCache(
+        os.path.join(TEMP_CACHE_DIR, f'{name}.sqlite3'), {'OPTIONS': options})
+
+
+def increment(name):
+    cache = make_cache(name)
+    for _ in range(50):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def test_get_set_delete(self):
+        """Значения любых типов сохраняются, читаются и удаляются."""
+        cache = make_cache('basic')
+        values = {'int': 1, 'text': 'текст', 'list': [1, (2, 3)], 'no': False}
+        cache.set_many(values)
+        self.assertEqual(cache.get_many(list(values) + ['missing']), values)
+        cache.delete('text')
+        self.assertIsNone(cache.get('text'))
+        self.assertEqual(cache.get('text', 'default'), 'default')
+        cache.clear()
+        self.assertEqual(cache.size(), 0)
+
+    def test_timeout(self):
+        """Просроченное значение не читается и уступает место add."""
+        cache = make_cache('timeout')
+        cache.set('key', 'old', 0.01)
+        time.sleep(0.02)
+        self.assertFalse(cache.has_key('key'))
+        self.assertTrue(cache.add('key', 'new'))
+        self.assertFalse(cache.add('key', 'newer'))
+        self.assertEqual(cache.get('key'), 'new')
+
+    def test_incr_is_shared_between_processes(self):
+        """incr атомарен и виден другим процессам."""
+        cache = make_cache('shared')
+        cache.set('counter', 0)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        processes = [
+            get_context('fork').Process(target=increment, args=['shared'])
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(cache.get('counter'), 200)
+
+    def test_size_cap_evicts_least_recently_read(self):
+        """Сверх MAX_SIZE вытесняются давно не читанные записи."""
+        cache = make_cache('lru', MAX_SIZE=10000, CULL_FRACTION=0.3)
+        cache.set_many({'old': 'x' * 1000, 'kept': 'x' * 1000})
+        cache.connection.execute(
+            'UPDATE cache_entries SET accessed = accessed - 10')
+        for i in range(3):
+            cache.set(f'first_{i}', 'x' * 1000)
+        cache.get('kept')
+        for i in range(5):
+            cache.set(f'second_{i}', 'x' * 1000)
+        self.assertIsNone(cache.get('old'))
+        self.assertIsNone(cache.get('first_0'))
+        self.assertIsNotNone(cache.get('kept'))
+        self.assertIsNotNone(cache.get('second_4'))
+        self.assertLessEqual(cache.size(), 7000)
+
+    def test_read_skips_mark_when_locked(self):
+        """Чтение не ждёт чужую запись ради отметки LRU."""
+        cache = make_cache('locked', TOUCH_TIMEOUT=0.01)
+        cache.set('key', 'value')
+        cache.connection.execute(
+            'UPDATE cache_entries SET accessed = accessed - 10')
+        writer = sqlite3.connect(cache.path, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            started = time.monotonic()
+            self.assertEqual(cache.get('key'), 'value')
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        cache.set('other', 'value')
+
+
+def overwrite(key, value):
+    caches['default'].set(key, value)
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'L1_PREFIXES': ['l1:']},
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(TEMP_CACHE_DIR, 'tiered.sqlite3'),
+    },
+})
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.cache.sync()
+
+    def test_hot_keys_served_from_l1(self):
+        """Повторное чтение обслуживает L1, статистика ведётся по уровням."""
+        caches['shared'].set('l1:hot', 'value')
+        before = self.cache.stats()
+        for _ in range(3):
+            self.assertEqual(self.cache.get('l1:hot'), 'value')
+        self.assertIsNone(self.cache.get('l1:cold'))
+        stats = self.cache.stats()
+        self.assertEqual(stats['l1_hits'] - before.get('l1_hits', 0), 2)
+        self.assertEqual(
+            stats['shared_hits'] - before.get('shared_hits', 0), 1)
+        self.assertEqual(
+            stats['shared_misses'] - before.get('shared_misses', 0), 1)
+
+    def test_overwrite_in_other_process_invalidates_l1(self):
+        """Перезапись в другом процессе сбрасывает L1 при сверке."""
+        self.cache.set('l1:post', 'old')
+        self.assertEqual(self.cache.get('l1:post'), 'old')
+        process = get_context('fork').Process(
+            target=overwrite, args=['l1:post', 'new'])
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('l1:post'), 'old')
+        CacheGenerationMiddleware(lambda request: None)(
+            RequestFactory().get('/'))
+        self.assertEqual(self.cache.get('l1:post'), 'new')
+
+    def test_own_writes_are_visible(self):
+        """Свои запись, incr и удаление видны без сверки."""
+        self.cache.set('l1:counter', 1)
+        self.cache.get('l1:counter')
+        self.assertEqual(self.cache.incr('l1:counter'), 2)
+        self.assertEqual(self.cache.get('l1:counter'), 2)
+        self.cache.delete('l1:counter')
+        self.assertIsNone(self.cache.get('l1:counter'))
+
+    def test_other_keys_bypass_l1(self):
+        """Ключи вне префиксов L1 не попадают в него и не сбрасывают его."""
+        generation = caches['shared'].get(GENERATION_KEY)
+        self.cache.set('page', 'old')
+        self.cache.set('page', 'new')
+        self.cache.add('lock', 1)
+        self.cache.delete('lock')
+        self.assertEqual(self.cache.get('page'), 'new')
+        self.assertEqual(caches['shared'].get(GENERATION_KEY), generation)
+        self.assertEqual(self.cache.stats()['l1_entries'], 0)
+
+    def test_rewrite_after_eviction_invalidates_l1(self):
+        """Запись ключа L1, пропавшего из общего кэша, тоже рассылается."""
+        self.cache.set('l1:version', 1)
+        generation = caches['shared'].get(GENERATION_KEY)
+        caches['shared'].delete('l1:version')
+        self.cache.set('l1:version', 2)
+        self.assertNotEqual(
+            caches['shared'].get(GENERATION_KEY), generation)
+
+    def test_value_read_during_reset_not_remembered(self):
+        """Прочитанное до сброса L1 другим потоком в L1 не кладётся."""
+        caches['shared'].set('l1:post', 'old')
+        shared_get_many = caches['shared'].get_many
+
+        def get_many(*args, **kwargs):
+            values = shared_get_many(*args, **kwargs)
+            self.cache.l1.reset(-1)
+            return values
+
+        with mock.patch.object(caches['shared'], 'get_many', get_many):
+            self.assertEqual(self.cache.get('l1:post'), 'old')
+        self.assertEqual(self.cache.stats()['l1_entries'], 0)
@@ -0,0 +1,94 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+
+from posts.models import Post, User
+
+from ..middleware import ReplicaMiddleware
+from ..routers import (STICKY_COOKIE, ReplicaRouter, read_from_replica,
+                       use_primary)
+
+
+def reader(request):
+    return HttpResponse(router.db_for_read(Post))
+
+
+def writer(request):
+    router.db_for_write(Post)
+    return HttpResponse(router.db_for_read(Post))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_LAG=5)
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(
+            connections.databases, {'replica': {'NAME': 'replica'}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, view, **cookies):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        return ReplicaMiddleware(view)(request)
+
+    def test_reads_from_replica_only_in_marked_views(self):
+        """С реплики читают только вьюхи под read_from_replica."""
+        self.assertEqual(self.get(read_from_replica(reader)).content,
+                         b'replica')
+        self.assertEqual(self.get(reader).content, b'default')
+        self.assertIsNone(ReplicaRouter().db_for_read(Post))
+
+    def test_write_pins_user_to_primary(self):
+        """После записи чтения идут на основную базу, кука закрепляет её."""
+        response = self.get(read_from_replica(writer))
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 5)
+        response = self.get(read_from_replica(reader), **{STICKY_COOKIE: '1'})
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_cache_fills_read_from_primary(self):
+        """Внутри use_primary чтения идут на основную базу."""
+        def view(request):
+            with use_primary():
+                filled = router.db_for_read(Post)
+            return HttpResponse(f'{filled} {router.db_for_read(Post)}')
+        self.assertEqual(
+            self.get(read_from_replica(view)).content, b'default replica')
+
+
+class SyncReplicasTest(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_copies_primary(self):
+        """Команда копирует основную базу в файлы реплик."""
+        path = os.path.join(self.directory, 'replica.sqlite3')
+        user = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый пост', author=user)
+        with override_settings(DATABASE_REPLICAS=['replica']), \
+                mock.patch.dict(connections.databases,
+                                {'replica': {'NAME': path}}):
+            call_command('sync_replicas', stdout=StringIO())
+        replica = sqlite3.connect(path)
+        self.addCleanup(replica.close)
+        self.assertEqual(
+            replica.execute('SELECT text FROM posts_post').fetchall(),
+            [('Тестовый пост',)])
+
+    @override_settings(REPLICA_LAG=5)
+    def test_interval_must_be_below_lag(self):
+        """Интервал не меньше REPLICA_LAG отвергается."""
+        with self.assertRaises(CommandError):
+            call_command('sync_replicas', '--interval', '5')
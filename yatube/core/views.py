@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from .middleware import tiered_caches
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +19,11 @@ def permission_denied(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def cache_stats(request):
+    """Попадания и промахи двухуровневых кэшей в обслужившем процессе."""
+    return JsonResponse({
+        alias: cache.stats() for alias, cache in tiered_caches().items()
+    })
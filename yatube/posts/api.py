@@ -0,0 +1,120 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from . import recent
+from .conditional import conditional
+from .models import Group, Post, User
+from .utils import paginator
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'updated': post.updated.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'image_width': post.image_width,
+        'image_height': post.image_height,
+        'comments_count': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'author': comment.author.username,
+    }
+
+
+def links(page_obj):
+    """Query-строки соседних страниц: курсор или номер, как в HTML."""
+    if getattr(page_obj, 'cursor_mode', False):
+        return {
+            'next': page_obj.next_cursor and f'?cursor={page_obj.next_cursor}',
+            'previous': page_obj.previous_cursor and (
+                f'?cursor={page_obj.previous_cursor}'),
+        }
+    next_cursor = getattr(page_obj, 'next_cursor', None)
+    if next_cursor:
+        next_link = f'?cursor={next_cursor}'
+    elif page_obj.has_next():
+        next_link = f'?page={page_obj.next_page_number()}'
+    else:
+        next_link = None
+    return {
+        'next': next_link,
+        'previous': f'?page={page_obj.previous_page_number()}'
+        if page_obj.has_previous() else None,
+    }
+
+
+def page_response(page_obj, serialize):
+    """JSON страницы без шаблонов: сериализуем объекты напрямую."""
+    data = {'results': [serialize(item) for item in page_obj]}
+    data.update(links(page_obj))
+    return HttpResponse(
+        json.dumps(data, ensure_ascii=False),
+        content_type='application/json')
+
+
+@require_safe
+@conditional('index', 'groups', 'comments')
+def index(request):
+    return page_response(
+        paginator(Post.objects.for_listing(), request), serialize_post)
+
+
+@require_safe
+@conditional('group:{slug}', 'comments')
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return page_response(
+        paginator(group.posts.for_listing(), request), serialize_post)
+
+
+@require_safe
+@conditional('author:{username}', 'groups', 'comments')
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return page_response(
+        paginator(author.posts.for_listing(), request), serialize_post)
+
+
+@require_safe
+@conditional('post:{post_id}')
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = post.comments.select_related('author').only(
+        'text', 'created', 'author__username')
+    return page_response(
+        paginator(comments, request, key=('created', 'id')),
+        serialize_comment)
+
+
+def new_posts_response(request, authors=None):
+    """Сколько постов вышло после ``?since=<id>``, без запросов к БД."""
+    since = request.GET.get('since', '0')
+    if not since.isdigit():
+        return HttpResponseBadRequest()
+    ids, more = recent.newer(int(since), authors)
+    return JsonResponse({'count': len(ids), 'ids': ids, 'more': more})
+
+
+@require_safe
+def new_posts(request):
+    return new_posts_response(request)
+
+
+@require_safe
+@login_required
+def follow_new_posts(request):
+    return new_posts_response(request, recent.followed(request.user.pk))
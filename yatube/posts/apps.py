@@ -1,5 +1,22 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate, pre_migrate
+
+
+def install_search(using, **kwargs):
+    from . import search
+    search.install(connections[using])
+
+
+def uninstall_search_source(using, **kwargs):
+    from . import search
+    search.uninstall_source(connections[using])
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        pre_migrate.connect(uninstall_search_source, sender=self)
+        post_migrate.connect(install_search, sender=self)
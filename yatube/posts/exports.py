@@ -0,0 +1,93 @@
+import csv
+import json
+
+from django.conf import settings
+
+from .models import Comment, Post
+
+# Поля выгрузки совпадают с форматом import_yatube: ссылки — это id,
+# а строка NDJSON несёт имя модели.
+FIELDS = {
+    'posts': ('id', 'author', 'group', 'text', 'pub_date', 'updated',
+              'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+}
+MODELS = {
+    'posts': 'post',
+    'comments': 'comment',
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def queryset(kind, author=None, group=None):
+    """Записи автора или группы; комментарии — к их постам."""
+    posts = Post.objects.all()
+    if author is not None:
+        posts = posts.filter(author=author)
+    if group is not None:
+        posts = posts.filter(group=group)
+    if kind == 'posts':
+        return posts
+    return Comment.objects.filter(post__in=posts.values('pk'))
+
+
+def rows(kind, records, after=None):
+    """Кортежи полей по возрастанию id, начиная после ``after``.
+
+    Каждая порция — отдельный запрос от последнего id: курсор не висит
+    открытым, пока медленный клиент скачивает выгрузку, а память
+    не зависит от её размера.
+    """
+    records = records.order_by('pk').values_list(*FIELDS[kind])
+    while True:
+        if after is not None:
+            chunk = list(records.filter(pk__gt=after)[:chunk_size()])
+        else:
+            chunk = list(records[:chunk_size()])
+        yield from chunk
+        if len(chunk) < chunk_size():
+            return
+        after = chunk[-1][0]
+
+
+def value(item):
+    return item.isoformat() if hasattr(item, 'isoformat') else item
+
+
+def ndjson(kind, rows):
+    model = MODELS[kind]
+    for row in rows:
+        record = {'model': model}
+        record.update(zip(FIELDS[kind], map(value, row)))
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """Файл для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, line):
+        return line
+
+
+def csv_lines(kind, rows, header=True):
+    writer = csv.writer(Echo())
+    if header:
+        yield writer.writerow(FIELDS[kind])
+    for row in rows:
+        yield writer.writerow(
+            ['' if item is None else value(item) for item in row])
+
+
+def stream(kind, format, records, after=None):
+    """Строки выгрузки в формате ``format``; продолжение выгрузки CSV
+    идёт без заголовка, чтобы его можно было дописать к начатому файлу."""
+    if format == 'ndjson':
+        return ndjson(kind, rows(kind, records, after))
+    return csv_lines(kind, rows(kind, records, after), header=after is None)
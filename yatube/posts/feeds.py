@@ -0,0 +1,197 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from core.routers import use_primary
+
+from .models import FeedEntry, Follow, Post
+from .utils import (NEXT, CursorPage, CursorPaginator, decode_cursor,
+                    encode_cursor, paginator, sort)
+
+
+def batch_size():
+    return getattr(settings, 'FEED_FANOUT_BATCH_SIZE', 1000)
+
+
+def engine():
+    return getattr(settings, 'FOLLOW_FEED_ENGINE', 'fanout')
+
+
+def write_entries(entries):
+    entries = iter(entries)
+    size = batch_size()
+    while True:
+        batch = list(islice(entries, size))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True).iterator(chunk_size=batch_size())
+    write_entries(
+        FeedEntry(user_id=user_id, post_id=post.pk,
+                  author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers
+    )
+
+
+def backfill(follow):
+    """Переносит посты автора в ленту нового подписчика."""
+    posts = Post.objects.filter(author_id=follow.author_id).order_by(
+    ).values_list('pk', 'pub_date').iterator(chunk_size=batch_size())
+    write_entries(
+        FeedEntry(user_id=follow.user_id, post_id=post_id,
+                  author_id=follow.author_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def prune(follow):
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id).delete()
+
+
+def timeline_length():
+    return getattr(settings, 'FEED_TIMELINE_LENGTH', 100)
+
+
+def timeline_key(author_id):
+    return f'timeline:{author_id}'
+
+
+def forget_timeline(author_id):
+    cache.delete(timeline_key(author_id))
+
+
+def load_timelines(author_ids):
+    """Свежие ключи (pub_date, id) постов каждого автора из кэша или БД."""
+    keys = {timeline_key(author_id): author_id for author_id in author_ids}
+    timelines = {
+        keys[key]: timeline for key, timeline in cache.get_many(keys).items()
+    }
+    missing_ids = [
+        author_id for author_id in author_ids if author_id not in timelines]
+    length = timeline_length()
+    with use_primary():
+        rows = newest_posts(missing_ids, length + 1)
+    missing = {}
+    for author_id in missing_ids:
+        entries = rows.get(author_id, [])
+        timelines[author_id] = (entries[:length], len(entries) <= length)
+        missing[timeline_key(author_id)] = timelines[author_id]
+    cache.set_many(missing, getattr(settings, 'FEED_TIMELINE_TIMEOUT', None))
+    return timelines
+
+
+def newest_posts(author_ids, limit):
+    """Ключи (pub_date, id) до ``limit`` свежих постов каждого автора
+    одним запросом: ROW_NUMBER() по автору вместо запроса на автора."""
+    if not author_ids:
+        return {}
+    ranked = Post.objects.filter(author_id__in=author_ids).annotate(
+        place=Window(
+            RowNumber(), partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        )).values('id', 'author_id', 'pub_date', 'place')
+    # Django 2.2 не фильтрует по оконным функциям: оборачиваем запрос.
+    sql, params = ranked.query.sql_with_params()
+    posts = Post.objects.raw(
+        f'SELECT id, author_id, pub_date FROM ({sql}) ranked '
+        f'WHERE place <= %s ORDER BY author_id, pub_date DESC, id DESC',
+        [*params, limit])
+    rows = {}
+    for post in posts:
+        rows.setdefault(post.author_id, []).append((post.pub_date, post.pk))
+    return rows
+
+
+def author_timeline(author_id, timeline, before=None):
+    """Ключи постов автора по убыванию, строго меньше before.
+
+    Когда кэшированный хвост кончается, а у автора есть посты старше,
+    чтение продолжается из БД порциями по индексу (author, -pub_date).
+    """
+    entries, complete = timeline
+    for entry in entries:
+        if before is None or entry < before:
+            yield entry
+    if complete:
+        return
+    cursor = entries[-1] if before is None else min(entries[-1], before)
+    posts = Post.objects.filter(author_id=author_id)
+    length = timeline_length()
+    while True:
+        rows = list(
+            posts.filter(
+                CursorPaginator(posts, length).boundary(list(cursor), 'lt'))
+            .order_by('-pub_date', '-id')
+            .values_list('pub_date', 'id')[:length]
+        )
+        yield from rows
+        if len(rows) < length:
+            return
+        cursor = rows[-1]
+
+
+def fanout_page(request):
+    entries = FeedEntry.objects.filter(user=request.user).select_related(
+        'post__author', 'post__group')
+    page_obj = paginator(entries, request, key=('pub_date', 'post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
+    return page_obj
+
+
+def pull_page(request):
+    """Страница ленты k-way слиянием хронологий авторов.
+
+    Слияние ленивое: heapq.merge достаёт из хронологий ровно столько
+    ключей, сколько нужно для страницы и признака следующей.
+    """
+    before = None
+    cursor = decode_cursor(request.GET.get('cursor', ''))
+    if cursor and cursor[0] == NEXT:
+        before = CursorPaginator(Post.objects.all(), sort).parse_values(
+            cursor[1])
+        before = tuple(before) if before else None
+    author_ids = list(Follow.objects.filter(
+        user=request.user).values_list('author_id', flat=True))
+    timelines = load_timelines(author_ids)
+    merged = heapq.merge(
+        *(author_timeline(author_id, timelines[author_id], before)
+          for author_id in author_ids),
+        reverse=True,
+    )
+    keys = list(islice(merged, sort + 1))
+    posts = Post.objects.for_listing().in_bulk(
+        [post_id for _, post_id in keys[:sort]])
+    object_list = [
+        posts[post_id] for _, post_id in keys[:sort] if post_id in posts]
+    next_cursor = None
+    if len(keys) > sort:
+        pub_date, post_id = keys[sort - 1]
+        next_cursor = encode_cursor(NEXT, [pub_date.isoformat(), post_id])
+    return CursorPage(object_list, next_cursor=next_cursor)
+
+
+def join_page(request):
+    post_list = Post.objects.for_listing().filter(
+        author__following__user=request.user)
+    return paginator(post_list, request)
+
+
+ENGINES = {
+    'fanout': fanout_page,
+    'pull': pull_page,
+    'join': join_page,
+}
+
+
+def follow_page(request):
+    return ENGINES[engine()](request)
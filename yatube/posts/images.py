@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from . import thumbnails
+from .models import Post
+from .signals import move_blob_reference, post_page_scopes
+from .thumbnails import webp_name
+from .utils import bump_page_versions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def workers():
+    return getattr(settings, 'IMAGE_WORKERS', 2)
+
+
+def max_size():
+    return getattr(settings, 'IMAGE_MAX_SIZE', 2048)
+
+
+def quality():
+    return getattr(settings, 'IMAGE_QUALITY', 85)
+
+
+def flatten(image):
+    """Убирает прозрачность и палитру: JPEG умеет только RGB и L."""
+    if image.mode in ('RGB', 'L'):
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def normalize(data, size, quality):
+    """Поворачивает по EXIF, уменьшает и пересохраняет без метаданных.
+
+    Выполняется в отдельном процессе, поэтому работает только с байтами
+    и не трогает Django. Возвращает размеры, JPEG и WebP (или None, если
+    Pillow собран без WebP); анимацию только измеряет.
+    """
+    with Image.open(BytesIO(data)) as image:
+        if getattr(image, 'is_animated', False):
+            return image.size, None, None
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.LANCZOS)
+        image = flatten(image)
+        jpeg = BytesIO()
+        image.save(jpeg, 'JPEG', quality=quality, optimize=True,
+                   progressive=True)
+        webp = None
+        if features.check('webp'):
+            webp = BytesIO()
+            image.save(webp, 'WEBP', quality=quality, method=6)
+            webp = webp.getvalue()
+        return image.size, jpeg.getvalue(), webp
+
+
+def store(post_id, name, result):
+    """Сохраняет обработанный JPEG с WebP-копией и размеры картинки.
+
+    Хранилище само раскладывает файлы по хешу содержимого, а оригинал
+    удалит collect_blobs, когда на него не останется ссылок. update()
+    минует post_save, поэтому updated и версии страниц меняем сами.
+    """
+    (width, height), jpeg, webp = result
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id, image=name).first()
+    if post is None:
+        return
+    storage = post.image.storage
+    new_name = name
+    if jpeg is not None:
+        new_name = storage.save(
+            f'{os.path.splitext(name)[0]}.jpg', ContentFile(jpeg))
+        if webp is not None:
+            storage.save_derived(webp_name(new_name), ContentFile(webp))
+    updated = Post.objects.filter(pk=post_id, image=name).update(
+        image=new_name, image_width=width, image_height=height,
+        updated=timezone.now())
+    if updated:
+        move_blob_reference(name, new_name)
+        bump_page_versions(*post_page_scopes(post))
+    thumbnails.submit(post_id)
+
+
+def finish(post_id, name, future):
+    try:
+        store(post_id, name, future.result())
+    except Exception:
+        logger.exception('Не удалось обработать картинку поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def submit(post_id):
+    global _executor
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return
+    name = post.image.name
+    try:
+        with post.image.open('rb') as image:
+            data = image.read()
+    except OSError:
+        logger.exception('Нет файла картинки поста %s', post_id)
+        return
+    if not workers():
+        try:
+            store(post_id, name, normalize(data, max_size(), quality()))
+        except Exception:
+            logger.exception(
+                'Не удалось обработать картинку поста %s', post_id)
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(workers())
+    future = _executor.submit(normalize, data, max_size(), quality())
+    future.add_done_callback(
+        lambda future: finish(post_id, name, future))
+
+
+def wait():
+    """Дожидается всех отправленных в пул картинок (для команд)."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def measure(post, image):
+    """Записывает в пост размеры загруженной картинки.
+
+    ``image`` — файл из формы: валидация ImageField уже открыла его
+    в Pillow, поэтому размеры известны без повторного чтения.
+    """
+    opened = getattr(image, 'image', None)
+    if not post.image:
+        post.image_width = post.image_height = None
+    elif opened is not None:
+        post.image_width, post.image_height = opened.size
+
+
+def enqueue(post):
+    """Ставит картинку поста в обработку после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(lambda: submit(post.pk))
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+def lru_size():
+    return getattr(settings, 'THUMBNAIL_LRU_SIZE', 1000)
+
+
+class KVStore(KVStoreBase):
+    """Хранилище sorl: LRU процесса и кеш Django перед таблицей sorl.
+
+    Записи о миниатюрах пишутся и в таблицу thumbnail_kvstore, и в кеш;
+    читаются из LRU, затем из кеша и лишь при промахе из таблицы, так
+    что вытеснение из кеша ничего не теряет. Перечисляет ключи тоже
+    таблица. В LRU попадают только найденные значения. Удаление в другом
+    процессе не вытесняет их из локального LRU, но записи о миниатюрах
+    неизменны, а удаляются редко и вместе с файлами.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+
+    @property
+    def cache(self):
+        return caches[thumbnail_settings.THUMBNAIL_CACHE]
+
+    def remember(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > lru_size():
+                self._local.popitem(last=False)
+
+    def forget(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def warm(self, items):
+        """Кладёт пары (ключ, значение) из таблицы в кеш и LRU."""
+        items = dict(items)
+        self.cache.set_many(
+            items, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        for key, value in items.items():
+            self.remember(key, value)
+
+    def load(self, keys):
+        """Находит ключи в кеше, а не найденные — одним запросом к таблице."""
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            rows = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            self.warm(rows)
+            found.update(rows)
+        for key, value in found.items():
+            self.remember(key, value)
+        return found
+
+    def prefetch(self, image_files):
+        """Загружает записи для всех картинок страницы разом."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        with self._lock:
+            missing = [key for key in keys if key not in self._local]
+        if missing:
+            self.load(missing)
+
+    def _get_raw(self, key):
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                return self._local[key]
+        return self.load([key]).get(key)
+
+    def _set_raw(self, key, value):
+        KVStoreModel.objects.update_or_create(
+            key=key, defaults={'value': value})
+        self.warm({key: value})
+
+    def _delete_raw(self, *keys):
+        KVStoreModel.objects.filter(key__in=keys).delete()
+        self.cache.delete_many(keys)
+        self.forget(*keys)
+
+    def _find_keys_raw(self, prefix):
+        return list(KVStoreModel.objects.filter(
+            key__startswith=prefix).values_list('key', flat=True))
@@ -0,0 +1,107 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from posts import feeds
+from posts.models import Follow, Post, User
+from posts.utils import NEXT, encode_cursor
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает движки ленты подписок на синтетическом графе '
+            'со степенным распределением подписок; данные откатываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--posts-per-author', type=int, default=20)
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель распределения Парето для популярности авторов '
+                 'и числа подписок читателя')
+        parser.add_argument('--samples', type=int, default=100)
+        parser.add_argument('--pages', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            readers, authors = self.build_graph(rng, options)
+            sample = rng.sample(readers, min(options['samples'], len(readers)))
+            for name in feeds.ENGINES:
+                self.report(name, sample, options['pages'])
+            transaction.set_rollback(True)
+        cache.delete_many(
+            [feeds.timeline_key(author.pk) for author in authors])
+
+    def build_graph(self, rng, options):
+        prefix = f'bench_{timezone.now():%H%M%S}_'
+        User.objects.bulk_create(
+            User(username=f'{prefix}{i}') for i in range(options['users']))
+        users = list(User.objects.filter(username__startswith=prefix))
+        authors = users[:options['authors']]
+        readers = users[options['authors']:]
+        popularity = [rng.paretovariate(options['alpha']) for _ in authors]
+        now = timezone.now()
+        posts = [
+            Post(text=f'Пост {i}', author=author)
+            for author in authors
+            for i in range(options['posts_per_author'])
+        ]
+        Post.objects.bulk_create(posts)
+        for post_id in Post.objects.filter(
+                author__in=authors).values_list('pk', flat=True):
+            Post.objects.filter(pk=post_id).update(
+                pub_date=now - timedelta(minutes=rng.randrange(10 ** 6)))
+        follows = []
+        for reader in readers:
+            size = min(len(authors),
+                       int(rng.paretovariate(options['alpha'])))
+            chosen = set(rng.choices(authors, weights=popularity, k=size))
+            follows.extend(
+                Follow(user=reader, author=author) for author in chosen)
+        Follow.objects.bulk_create(follows)
+        for follow in follows:
+            feeds.backfill(follow)
+        self.stdout.write(
+            f'Читателей: {len(readers)}, авторов: {len(authors)}, '
+            f'подписок: {len(follows)}, постов: {len(posts)}')
+        return readers, authors
+
+    def read_feed(self, engine, user, pages):
+        factory = RequestFactory()
+        start = timezone.now() + timedelta(days=1)
+        params = {'cursor': encode_cursor(NEXT, [start.isoformat(), 0])}
+        for _ in range(pages):
+            request = factory.get('/follow/', params)
+            request.user = user
+            page_obj = engine(request)
+            for post in page_obj:
+                post.author.username
+            if not getattr(page_obj, 'next_cursor', None):
+                return
+            params = {'cursor': page_obj.next_cursor}
+
+    def report(self, name, sample, pages):
+        engine = feeds.ENGINES[name]
+        for user in sample:
+            self.read_feed(engine, user, pages)
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for user in sample:
+                started = time.perf_counter()
+                self.read_feed(engine, user, pages)
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        mean = sum(timings) / len(timings) * 1000
+        p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+        self.stdout.write(
+            f'{name:>7}: среднее {mean:.2f} мс, p95 {p95:.2f} мс, '
+            f'запросов на читателя {len(queries) / len(sample):.1f}')
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import Blob, Post
+from posts.thumbnails import webp_name
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые не ссылается ни один пост')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=int, default=24,
+            help='Не трогать файлы моложе этого срока: ссылка на только '
+                 'что загруженный файл может быть ещё не записана')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько записей Blob удалять одним запросом')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        referenced = set(
+            Blob.objects.filter(refs__gt=0).values_list('name', flat=True))
+        # WebP-копия живёт, пока жив её JPEG.
+        referenced |= {webp_name(name) for name in referenced}
+        removed = []
+        for filename in storage.listdir(directory)[1]:
+            name = f'{directory}/{filename}'
+            if name in referenced:
+                continue
+            if storage.get_modified_time(name) > cutoff:
+                continue
+            removed.append(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+        if not options['dry_run']:
+            for names in batches(removed, options['batch_size']):
+                Blob.objects.filter(refs=0, name__in=names).delete()
+        missing = self.sweep(storage, options['batch_size'],
+                             options['dry_run'])
+        self.stdout.write(
+            f'Неиспользуемых файлов: {len(removed)}, '
+            f'записей без файла: {missing}')
+
+    def sweep(self, storage, size, dry_run):
+        """Удаляет записи Blob без ссылок, чей файл уже пропал."""
+        missing = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                Blob.objects.filter(refs=0, pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'name')[:size])
+            if not rows:
+                return missing
+            last_pk = rows[-1][0]
+            ids = [pk for pk, name in rows if not storage.exists(name)]
+            missing += len(ids)
+            if dry_run:
+                continue
+            Blob.objects.filter(refs=0, pk__in=ids).delete()
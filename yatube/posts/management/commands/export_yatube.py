@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exports
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты или комментарии в NDJSON или CSV; '
+            'NDJSON читает import_yatube')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.FIELDS))
+        parser.add_argument(
+            '--format', choices=sorted(exports.FORMATS), default='ndjson')
+        parser.add_argument('--author', help='Имя пользователя автора')
+        parser.add_argument('--group', help='Slug группы')
+        parser.add_argument(
+            '--after', type=int,
+            help='Продолжить после записи с этим id')
+        parser.add_argument(
+            '--output', default='-', help='Файл или «-» для stdout')
+
+    def handle(self, *args, **options):
+        author = group = None
+        try:
+            if options['author']:
+                author = User.objects.get(username=options['author'])
+            if options['group']:
+                group = Group.objects.get(slug=options['group'])
+        except (User.DoesNotExist, Group.DoesNotExist) as error:
+            raise CommandError(error)
+        records = exports.queryset(options['kind'], author=author, group=group)
+        lines = exports.stream(
+            options['kind'], options['format'], records, options['after'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        # Дописываем в конец, чтобы --after продолжал начатый файл.
+        with open(options['output'], 'a', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(lines)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class Command(BaseCommand):
+    help = ('Загружает записи sorl-thumbnail из таблицы thumbnail_kvstore '
+            'в кеш THUMBNAIL_CACHE, например после его очистки')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько записей загружать за раз')
+
+    def handle(self, *args, **options):
+        kvstore = default.kvstore
+        size = options['chunk_size']
+        loaded = 0
+        last_key = ''
+        while True:
+            rows = list(
+                KVStoreModel.objects.filter(key__gt=last_key)
+                .order_by('key').values_list('key', 'value')[:size]
+            )
+            if not rows:
+                break
+            if hasattr(kvstore, 'warm'):
+                kvstore.warm(rows)
+            loaded += len(rows)
+            last_key = rows[-1][0]
+        self.stdout.write(f'Загружено записей: {loaded}')
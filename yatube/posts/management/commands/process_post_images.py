@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import images
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Обрабатывает картинки постов, загруженных до появления '
+            'конвейера: поворот, уменьшение, JPEG и WebP, размеры')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать заново все картинки, а не только без размеров')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        ids = list(posts.order_by('pk').values_list('pk', flat=True))
+        for post_id in ids:
+            images.submit(post_id)
+        images.wait()
+        self.stdout.write(f'Отправлено в обработку: {len(ids)}')
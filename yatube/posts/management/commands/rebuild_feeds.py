@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import feeds
+from posts.models import FeedEntry, Follow
+
+
+class Command(BaseCommand):
+    help = ('Заново строит материализованные ленты подписок '
+            '(нужно после переключения на движок fanout)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            for follow in Follow.objects.iterator():
+                feeds.backfill(follow)
+        self.stdout.write(
+            f'Записей в лентах: {FeedEntry.objects.count()}')
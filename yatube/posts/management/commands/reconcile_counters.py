@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Comment, Follow, Post, Profile, User
+
+
+def counts(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by()
+        .values_list(field).annotate(total=Count('id'))
+    )
+
+
+def chunks(queryset, size):
+    """Первичные ключи порциями, без OFFSET."""
+    last_pk = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок '
+            'и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк проверять за одну транзакцию')
+
+    def handle(self, *args, **options):
+        size = options['chunk_size']
+        created = fixed_profiles = fixed_posts = 0
+        for ids in chunks(User.objects.filter(profile__isnull=True), size):
+            Profile.objects.bulk_create(
+                Profile(user_id=user_id) for user_id in ids)
+            created += len(ids)
+        for ids in chunks(User.objects.all(), size):
+            fixed_profiles += self.reconcile_profiles(ids)
+        for ids in chunks(Post.objects.all(), size):
+            fixed_posts += self.reconcile_posts(ids)
+        self.stdout.write(
+            f'Создано профилей: {created}, исправлено профилей: '
+            f'{fixed_profiles}, исправлено постов: {fixed_posts}')
+
+    @transaction.atomic
+    def reconcile_profiles(self, ids):
+        posts = counts(Post.objects, 'author', ids)
+        followers = counts(Follow.objects, 'author', ids)
+        following = counts(Follow.objects, 'user', ids)
+        drifted = []
+        for profile in Profile.objects.select_for_update().filter(
+                user_id__in=ids):
+            actual = (
+                posts.get(profile.user_id, 0),
+                followers.get(profile.user_id, 0),
+                following.get(profile.user_id, 0),
+            )
+            stored = (profile.posts_count, profile.followers_count,
+                      profile.following_count)
+            if actual != stored:
+                (profile.posts_count, profile.followers_count,
+                 profile.following_count) = actual
+                drifted.append(profile)
+        Profile.objects.bulk_update(
+            drifted,
+            ['posts_count', 'followers_count', 'following_count'])
+        return len(drifted)
+
+    @transaction.atomic
+    def reconcile_posts(self, ids):
+        comments = counts(Comment.objects, 'post', ids)
+        drifted = []
+        for post in Post.objects.select_for_update().filter(
+                pk__in=ids).only('comments_count'):
+            actual = comments.get(post.pk, 0)
+            if post.comments_count != actual:
+                post.comments_count = actual
+                drifted.append(post)
+        Post.objects.bulk_update(drifted, ['comments_count'])
+        return len(drifted)
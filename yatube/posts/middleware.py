@@ -0,0 +1,64 @@
+from http import HTTPStatus
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_cache_key, get_conditional_response,
+                                learn_cache_key)
+
+from core.routers import use_primary
+
+from .utils import page_versions
+
+KEY_PREFIX = 'anonymous'
+
+
+class AnonymousPage(NamedTuple):
+    keys: dict
+    response: object
+
+
+def cacheable(request):
+    """Запрос без кук и авторизации: ответ одинаков для всех гостей."""
+    return (request.method in ('GET', 'HEAD') and not request.COOKIES
+            and 'HTTP_AUTHORIZATION' not in request.META)
+
+
+def fresh(page):
+    return page_versions(list(page.keys)) == list(page.keys.values())
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт гостям целые страницы из кэша до сессий, CSRF и шаблонов.
+
+    Кэшируются только ответы вьюх, отметивших себя surrogate-ключами
+    (add_surrogate_keys, cache_on_version). Сигналы моделей поднимают
+    версии ключей, и копия перестаёт считаться свежей; Vary ответа
+    учитывается в ключе кэша так же, как в CacheMiddleware Django.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not cacheable(request):
+            return self.get_response(request)
+        key = get_cache_key(request, KEY_PREFIX, 'GET', cache=cache)
+        page = cache.get(key) if key else None
+        if page is not None and fresh(page):
+            response = page.response
+            return get_conditional_response(
+                request, etag=response.get('ETag'), response=response)
+        # Ответ может лечь в кэш надолго — собираем его по основной базе.
+        with use_primary():
+            response = self.get_response(request)
+        keys = getattr(request, 'surrogate_keys', None)
+        if (keys and request.method == 'GET'
+                and response.status_code == HTTPStatus.OK
+                and not response.streaming and not response.cookies):
+            response['Surrogate-Key'] = ' '.join(sorted(keys))
+            timeout = getattr(settings, 'ANONYMOUS_PAGE_TIMEOUT', 60 * 60)
+            key = learn_cache_key(
+                request, response, timeout, KEY_PREFIX, cache=cache)
+            cache.set(key, AnonymousPage(keys, response), timeout)
+        return response
@@ -0,0 +1,14 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_auto_20221129_1903'),
+        ('posts', '0007_comment_follow'),
+    ]
+
+    operations = [
+    ]
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Post
+
+RECENT_KEY = 'recent_posts'
+
+
+def length():
+    return getattr(settings, 'RECENT_POSTS_LENGTH', 200)
+
+
+def following_key(user_id):
+    return f'following:{user_id}'
+
+
+def load():
+    """Пары (id, автор) свежих постов по убыванию id из кэша или БД."""
+    recent = cache.get(RECENT_KEY)
+    if recent is None:
+        recent = list(
+            Post.objects.order_by('-id').values_list('id', 'author_id')
+            [:length()])
+        cache.set(RECENT_KEY, recent, None)
+    return recent
+
+
+def forget():
+    """Сбрасывает список; вызывается после фиксации создания и удаления.
+
+    Список не правится на месте: два воркера, одновременно дописавшие
+    свои посты, потеряли бы один из них. Следующий опрос соберёт его
+    из БД одним запросом.
+    """
+    cache.delete(RECENT_KEY)
+
+
+def followed(user_id):
+    authors = cache.get(following_key(user_id))
+    if authors is None:
+        authors = set(Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True))
+        cache.set(following_key(user_id), authors, None)
+    return authors
+
+
+def forget_followed(user_id):
+    cache.delete(following_key(user_id))
+
+
+def newer(since, authors=None):
+    """id постов новее ``since`` и признак, что их больше, чем в кэше."""
+    recent = load()
+    ids = [
+        post_id for post_id, author_id in recent
+        if post_id > since and (authors is None or author_id in authors)
+    ]
+    more = len(recent) == length() and recent[-1][0] > since
+    return ids, more
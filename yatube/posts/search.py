@@ -0,0 +1,159 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import NEXT, CursorPage, decode_cursor, encode_cursor, sort
+
+FTS_TABLE = 'posts_post_fts'
+FTS_SOURCE = 'posts_post_fts_source'
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# Окончания для грубого стемминга русских слов в запросе: остаток слова
+# ищется префиксом, поэтому «котами» находит «кот», «кота» и «котик».
+SUFFIXES = sorted((
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ого', 'его', 'ому',
+    'ему', 'ыми', 'ими', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий',
+    'ой', 'ей', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ию', 'ью',
+    'ия', 'ья', 'ье', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+# unicode61 не считает «ё» буквой «е» с диакритикой, поэтому индекс
+# строится по тексту, где «ё» уже заменена.
+NORMALIZE = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+
+SCHEMA = [
+    f"""CREATE VIEW IF NOT EXISTS {FTS_SOURCE} AS
+        SELECT id, {NORMALIZE.format('text')} AS text FROM posts_post""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='{FTS_SOURCE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text)
+        VALUES (new.id, {NORMALIZE.format('new.text')});
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, {NORMALIZE.format('old.text')});
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, {NORMALIZE.format('old.text')});
+        INSERT INTO {FTS_TABLE}(rowid, text)
+        VALUES (new.id, {NORMALIZE.format('new.text')});
+        END""",
+]
+
+
+def enabled(using=None):
+    return (using or connection).vendor == 'sqlite'
+
+
+def install(using):
+    """Создаёт индекс FTS5 и триггеры синхронизации с posts_post.
+
+    SQLite-бэкенд Django пересоздаёт таблицу при изменении схемы и
+    теряет триггеры, поэтому вызывается после каждого migrate; если
+    триггеров не было, индекс перестраивается целиком.
+    """
+    if not enabled(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE %s", [f'{FTS_TABLE}_%'])
+        triggers = cursor.fetchone()[0]
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        if triggers < 3:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_source(using):
+    """Удаляет представление перед migrate: иначе SQLite не даст
+    переименовать пересозданную таблицу posts_post."""
+    if not enabled(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute(f'DROP VIEW IF EXISTS {FTS_SOURCE}')
+
+
+def stem(word):
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def match_expression(query):
+    words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+    return ' '.join(f'"{stem(word)}"*' for word in words)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+def filter_posts(queryset, query):
+    """Фильтр для админки: те же совпадения без ранжирования."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset
+    if not enabled():
+        return queryset.filter(text__icontains=query)
+    # RawSQL в pk__in берётся в двойные скобки, и SQLite считает такой
+    # подзапрос скалярным, поэтому условие добавляется через extra().
+    return queryset.extra(
+        where=[f'{queryset.model._meta.db_table}.id IN ('
+               f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'],
+        params=[expression])
+
+
+def search_page(query, token=None):
+    """Страница результатов по BM25 с keyset-пагинацией по (rank, id)."""
+    expression = match_expression(query)
+    if not expression or not enabled():
+        return CursorPage([])
+    after = []
+    condition = ''
+    position = decode_cursor(token) if token else None
+    if position and position[0] == NEXT and len(position[1]) == 2:
+        try:
+            rank, post_id = float(position[1][0]), int(position[1][1])
+        except (TypeError, ValueError):
+            rank = None
+        if rank is not None:
+            after = [rank, rank, post_id]
+            condition = 'WHERE rank > %s OR (rank = %s AND id > %s)'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT id, rank, snippet FROM (
+                SELECT rowid AS id, bm25({FTS_TABLE}) AS rank,
+                       snippet({FTS_TABLE}, 0, %s, %s, '…', 24) AS snippet
+                FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+            ) {condition} ORDER BY rank, id LIMIT %s""",
+            [HIGHLIGHT_START, HIGHLIGHT_END, expression, *after, sort + 1])
+        rows = cursor.fetchall()
+    posts = Post.objects.for_listing().in_bulk(
+        [post_id for post_id, _, _ in rows[:sort]])
+    object_list = []
+    for post_id, _, snippet in rows[:sort]:
+        if post_id in posts:
+            posts[post_id].snippet = highlight(snippet)
+            object_list.append(posts[post_id])
+    next_cursor = None
+    if len(rows) > sort:
+        post_id, rank, _ = rows[sort - 1]
+        next_cursor = encode_cursor(NEXT, [rank, post_id])
+    return CursorPage(object_list, next_cursor=next_cursor)
@@ -0,0 +1,213 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import feeds, recent
+from .models import Blob, Comment, Follow, Group, Post, Profile, User
+from .utils import bump_page_versions
+
+
+def change_counter(queryset, field, delta):
+    if delta > 0:
+        value = F(field) + delta
+    else:
+        value = Greatest(F(field) + delta, 0)
+    queryset.update(**{field: value})
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(
+            Profile.objects.filter(user_id=instance.author_id),
+            'posts_count', 1)
+        feeds.forget_timeline(instance.author_id)
+        transaction.on_commit(recent.forget)
+        if feeds.engine() == 'fanout':
+            feeds.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_counter(
+        Profile.objects.filter(user_id=instance.author_id),
+        'posts_count', -1)
+    feeds.forget_timeline(instance.author_id)
+    transaction.on_commit(recent.forget)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(
+            Post.objects.filter(pk=instance.post_id), 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_counter(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(
+            Profile.objects.filter(user_id=instance.user_id),
+            'following_count', 1)
+        change_counter(
+            Profile.objects.filter(user_id=instance.author_id),
+            'followers_count', 1)
+        user_id = instance.user_id
+        transaction.on_commit(lambda: recent.forget_followed(user_id))
+        if feeds.engine() == 'fanout':
+            feeds.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_counter(
+        Profile.objects.filter(user_id=instance.user_id),
+        'following_count', -1)
+    change_counter(
+        Profile.objects.filter(user_id=instance.author_id),
+        'followers_count', -1)
+    user_id = instance.user_id
+    transaction.on_commit(lambda: recent.forget_followed(user_id))
+    feeds.prune(instance)
+
+
+def move_blob_reference(old_name, new_name):
+    """Переносит ссылку поста с одного файла картинки на другой."""
+    if old_name == new_name:
+        return
+    if new_name:
+        Blob.objects.get_or_create(name=new_name)
+        change_counter(Blob.objects.filter(name=new_name), 'refs', 1)
+    if old_name:
+        change_counter(Blob.objects.filter(name=old_name), 'refs', -1)
+
+
+@receiver(post_save, sender=Post)
+def post_saved_blobs(sender, instance, raw=False, **kwargs):
+    if not raw:
+        move_blob_reference(
+            getattr(instance, '_old_image', None), instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_blobs(sender, instance, **kwargs):
+    move_blob_reference(instance.image.name, None)
+
+
+def post_page_scopes(post):
+    scopes = ['index', f'author:{post.author.username}', f'post:{post.pk}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_post(sender, instance, raw=False, **kwargs):
+    instance._old_group_slug = instance._old_image = None
+    if instance.pk and not raw:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group__slug', 'image').first()
+        if old:
+            instance._old_group_slug, instance._old_image = old
+
+
+@receiver(post_save, sender=Post)
+def post_saved_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = post_page_scopes(instance)
+    old_group_slug = getattr(instance, '_old_group_slug', None)
+    if old_group_slug:
+        scopes.append(f'group:{old_group_slug}')
+    bump_page_versions(*scopes)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_pages(sender, instance, **kwargs):
+    bump_page_versions(*post_page_scopes(instance))
+
+
+@receiver(pre_save, sender=Group)
+def remember_old_group(sender, instance, raw=False, **kwargs):
+    instance._old_slug = None
+    if instance.pk and not raw:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def group_saved_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = [f'group:{instance.slug}']
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug and old_slug != instance.slug:
+        # Ссылки на группу есть в карточках всех лент.
+        scopes += [f'group:{old_slug}', 'groups']
+    bump_page_versions(*scopes)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted_pages(sender, instance, **kwargs):
+    bump_page_versions(f'group:{instance.slug}', 'groups')
+
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_old_name(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    instance._old_name = None
+    # Вход сохраняет только last_login — имя не меняется.
+    if update_fields and not set(update_fields) & set(NAME_FIELDS):
+        return
+    if instance.pk and not raw:
+        instance._old_name = User.objects.filter(
+            pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_renamed_pages(sender, instance, raw=False, **kwargs):
+    old = getattr(instance, '_old_name', None)
+    new = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    if raw or old is None or old == new:
+        return
+    # Имя автора выводится в карточках его постов во всех лентах.
+    scopes = {'index', f'author:{instance.username}', f'author:{old[0]}'}
+    scopes.update(
+        f'group:{slug}' for slug in Group.objects.filter(
+            posts__author=instance).values_list('slug', flat=True).distinct())
+    bump_page_versions(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # 'comments' — для API-лент, где у постов есть число комментариев.
+        bump_page_versions(f'post:{instance.post_id}', 'comments')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_page_versions(
+            f'author:{instance.user.username}',
+            f'author:{instance.author.username}',
+        )
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит каждый уникальный файл один раз под sha256 содержимого.
+
+    Исходное имя задаёт только каталог и расширение. Повторная загрузка
+    того же файла возвращает уже сохранённое имя, поэтому на один файл
+    может ссылаться много постов; учёт ссылок ведёт модель Blob.
+    """
+
+    chunk_size = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно выбирается по содержимому в _save().
+        return name
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, temporary = tempfile.mkstemp(
+            dir=full_directory, suffix='.upload')
+        try:
+            with os.fdopen(descriptor, 'wb') as upload:
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    upload.write(chunk)
+            extension = os.path.splitext(filename)[1].lower()
+            name = posixpath.join(directory, digest.hexdigest() + extension)
+            if self.exists(name):
+                # Свежая дата защищает файл от collect_blobs, пока
+                # ссылка на него ещё не записана.
+                os.remove(temporary)
+                os.utime(self.path(name))
+            else:
+                os.replace(temporary, self.path(name))
+                if self.file_permissions_mode is not None:
+                    os.chmod(self.path(name), self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def save_derived(self, name, content):
+        """Сохраняет производный файл (например, WebP-копию) под заданным
+        именем, не хешируя его."""
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,70 @@
+from django import template
+from sorl.thumbnail import default
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+class Original:
+    """Оригинал картинки с размерами из модели, без чтения файла."""
+
+    srcset = webp_srcset = sizes = ''
+
+    def __init__(self, post):
+        self.url = post.image.url
+        self.width = post.image_width
+        self.height = post.image_height
+
+
+def srcset(urls):
+    return ', '.join(f'{url} {width}w' for width, url in sorted(urls.items()))
+
+
+class Responsive:
+    """Миниатюры всех ширин: самая широкая в src, остальные в srcset.
+
+    WebP-копии идут в ``<source>`` элемента ``<picture>``: формат
+    выбирает браузер, а файлы раздаются статикой. Копии пишутся вслед
+    за миниатюрами, и самая широкая — последней, поэтому её наличия
+    достаточно.
+    """
+
+    def __init__(self, variants, size):
+        widest = variants[max(variants)]
+        self.url = widest.url
+        self.width = widest.width
+        self.height = widest.height
+        self.srcset = srcset({
+            width: thumbnail.url for width, thumbnail in variants.items()})
+        self.webp_srcset = ''
+        if default.storage.exists(thumbnails.webp_name(widest.name)):
+            self.webp_srcset = srcset({
+                width: default.storage.url(thumbnails.webp_name(
+                    thumbnail.name))
+                for width, thumbnail in variants.items()})
+        self.sizes = thumbnails.SIZES[size]
+
+
+@register.simple_tag
+def post_thumbnail(post, size='card'):
+    """Миниатюра картинки поста или сама картинка, пока миниатюры нет."""
+    if not post.image:
+        return None
+    variants = thumbnails.ready(post.image, size)
+    if variants:
+        return Responsive(variants, size)
+    if not thumbnails.source_exists(post.image):
+        return Original(post)
+    if not thumbnails.workers():
+        thumbnails.create(post.image)
+        variants = thumbnails.ready(post.image, size)
+        return Responsive(variants, size) if variants else Original(post)
+    thumbnails.submit(post.pk)
+    return Original(post)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    thumbnails.prefetch(posts)
+    return ''
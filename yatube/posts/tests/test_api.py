@@ -0,0 +1,158 @@
+import time
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='api', description='Описание')
+        for i in range(12):
+            Post.objects.create(
+                text=f'Текст {i}', author=cls.user, group=cls.group)
+        cls.post = Post.objects.latest('pk')
+        Comment.objects.create(
+            text='Коммент', author=cls.user, post=cls.post)
+
+    def test_listings(self):
+        """Ленты отдают JSON с постами и ссылкой на следующую страницу."""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=['api']),
+            reverse('posts:api_profile', args=['author']),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                data = response.json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['id'], self.post.pk)
+                self.assertEqual(data['results'][0]['author'], 'author')
+                self.assertEqual(data['next'], '?page=2')
+                self.assertIsNone(data['previous'])
+
+    def test_comments(self):
+        """Комментарии поста отдаются в JSON."""
+        response = self.client.get(
+            reverse('posts:api_comments', args=[self.post.pk]))
+        self.assertEqual(
+            [comment['text'] for comment in response.json()['results']],
+            ['Коммент'])
+
+    def test_unknown_group(self):
+        """Несуществующая группа — 404."""
+        response = self.client.get(
+            reverse('posts:api_group_list', args=['missing']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без запросов к БД."""
+        url = reverse('posts:api_index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_changes_on_delete(self):
+        """После удаления If-Modified-Since не получает 304."""
+        url = reverse('posts:api_comments', args=[self.post.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+        later = time.time() + 10
+        with mock.patch('posts.utils.time.time', return_value=later):
+            Comment.objects.filter(post=self.post).delete()
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_etag_changes_on_edit_and_delete(self):
+        """ETag меняется при правке и удалении поста."""
+        url = reverse('posts:api_profile', args=['author'])
+        etags = [self.client.get(url)['ETag']]
+        post = Post.objects.earliest('pk')
+        post.text = 'Исправленный текст'
+        post.save()
+        etags.append(self.client.get(url)['ETag'])
+        Post.objects.filter(pk=post.pk).delete()
+        etags.append(self.client.get(url)['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+
+
+@override_settings(RECENT_POSTS_LENGTH=3)
+class NewPostsTest(TransactionTestCase):
+    # Кэш сбрасывается после фиксации транзакции, поэтому без TestCase.
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='writer')
+        self.other = User.objects.create_user(username='other')
+        self.seen = Post.objects.create(
+            text='Старый пост', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.url = reverse('posts:api_new_posts')
+
+    def test_new_posts_from_cache(self):
+        """Новые посты считаются по кэшу, сбрасываемому после фиксации."""
+        self.client.get(self.url, {'since': self.seen.pk})
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'since': self.seen.pk})
+        posts = [
+            Post.objects.create(text='Новый пост', author=self.author)
+            for _ in range(2)
+        ]
+        data = self.client.get(self.url, {'since': self.seen.pk}).json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['ids'], [post.pk for post in reversed(posts)])
+        self.assertFalse(data['more'])
+        Post.objects.create(text='Ещё пост', author=self.author)
+        data = self.client.get(self.url, {'since': self.seen.pk - 1}).json()
+        self.assertTrue(data['more'])
+        posts[0].delete()
+        data = self.client.get(self.url, {'since': self.seen.pk}).json()
+        self.assertEqual(data['count'], 2)
+
+    def test_rolled_back_post_keeps_cache(self):
+        """Откатанное создание поста кэш не трогает."""
+        self.client.get(self.url, {'since': self.seen.pk})
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            Post.objects.create(text='Черновик', author=self.author)
+            raise DatabaseError
+        with self.assertNumQueries(0):
+            data = self.client.get(self.url, {'since': self.seen.pk}).json()
+        self.assertEqual(data['count'], 0)
+
+    def test_follow_new_posts(self):
+        """Лента подписок считает только посты избранных авторов."""
+        self.client.force_login(self.user)
+        url = reverse('posts:api_follow_new_posts')
+        Post.objects.create(text='Чужой пост', author=self.other)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        data = self.client.get(url, {'since': self.seen.pk}).json()
+        self.assertEqual(data['ids'], [post.pk])
+        Follow.objects.create(user=self.user, author=self.other)
+        data = self.client.get(url, {'since': self.seen.pk}).json()
+        self.assertEqual(data['count'], 2)
+
+    def test_bad_since(self):
+        """Нечисловой since — 400."""
+        response = self.client.get(self.url, {'since': 'x'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from hashlib import sha256
 from http import HTTPStatus
 
 from django.conf import settings
@@ -79,7 +80,7 @@ class PostFormTest(TestCase):
                 text=form_data['text'],
                 group=form_data['group'],
                 author=self.user,
-                image='posts/small.gif'
+                image=f'posts/{sha256(small_gif).hexdigest()}.gif'
             ).exists()
         )
 
@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import images
+from ..models import Blob, Post
+from ..utils import page_versions
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
+
+
+def image_bytes(size, mode='RGB', fmt='JPEG', orientation=None):
+    buffer = BytesIO()
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        options['exif'] = exif.tobytes()
+    Image.new(mode, size, 'red').save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_WORKERS=0)
+class ImagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_normalize(self):
+        """Картинка поворачивается по EXIF, уменьшается и теряет EXIF."""
+        data = image_bytes((40, 20), orientation=6)
+        size, jpeg, _ = images.normalize(data, 10, 85)
+        self.assertEqual(size, (5, 10))
+        with Image.open(BytesIO(jpeg)) as result:
+            self.assertEqual(result.size, (5, 10))
+            self.assertEqual(dict(result.getexif()), {})
+
+    def test_normalize_transparent(self):
+        """Прозрачная картинка сохраняется в JPEG на белом фоне."""
+        data = image_bytes((4, 4), mode='RGBA', fmt='PNG')
+        _, jpeg, _ = images.normalize(data, 10, 85)
+        with Image.open(BytesIO(jpeg)) as result:
+            self.assertEqual(result.mode, 'RGB')
+
+    def test_create_records_size(self):
+        """Размеры картинки записываются при создании поста."""
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                'photo.png', image_bytes((30, 20), fmt='PNG'), 'image/png'),
+        })
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual((post.image_width, post.image_height), (30, 20))
+
+    def test_submit_replaces_original(self):
+        """Обработка заменяет оригинал на JPEG, переносит ссылку на него
+        и сбрасывает кеши страниц поста."""
+        post = Post.objects.create(
+            text='Тестовый текст',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'photo.png', image_bytes((30, 20), fmt='PNG'), 'image/png'),
+        )
+        original = post.image.name
+        updated = post.updated
+        scopes = ['index', f'post:{post.pk}']
+        versions = page_versions(scopes)
+        images.submit(post.pk)
+        post.refresh_from_db()
+        self.assertGreater(post.updated, updated)
+        self.assertNotEqual(page_versions(scopes), versions)
+        self.assertRegex(post.image.name, r'^posts/[0-9a-f]{64}\.jpg$')
+        self.assertEqual((post.image_width, post.image_height), (30, 20))
+        self.assertEqual(Blob.objects.get(name=original).refs, 0)
+        self.assertEqual(Blob.objects.get(name=post.image.name).refs, 1)
@@ -1,7 +1,13 @@
+import json
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 
-from ..models import Comment, Follow, Group, Post
+from .. import recent
+from ..models import Comment, FeedEntry, Follow, Group, Post, Profile
 
 User = get_user_model()
 
@@ -142,3 +148,124 @@ class FollowModelTest(TestCase):
             with self.subTest(value=value):
                 verbose_name = self.follow._meta.get_field(value).verbose_name
                 self.assertEqual(verbose_name, expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth1')
+        cls.author = User.objects.create_user(username='auth2')
+
+    def counters(self, user):
+        profile = Profile.objects.get(user=user)
+        return (profile.posts_count, profile.followers_count,
+                profile.following_count)
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев следуют за созданием и удалением."""
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        comment = Comment.objects.create(
+            text='Тестовый коммент', author=self.user, post=post)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author), (1, 0, 0))
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+
+    def test_follow_counters(self):
+        """Счётчики подписок следуют за подпиской и отпиской."""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.counters(self.user), (0, 0, 1))
+        self.assertEqual(self.counters(self.author), (0, 1, 0))
+        follow.delete()
+        self.assertEqual(self.counters(self.user), (0, 0, 0))
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+
+    def test_reconcile_counters(self):
+        """reconcile_counters исправляет расхождения счётчиков."""
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        Comment.objects.create(
+            text='Тестовый коммент', author=self.user, post=post)
+        Follow.objects.create(user=self.user, author=self.author)
+        Profile.objects.update(
+            posts_count=7, followers_count=7, following_count=7)
+        Post.objects.update(comments_count=7)
+        Profile.objects.filter(user=self.user).delete()
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.user), (0, 0, 1))
+        self.assertEqual(self.counters(self.author), (1, 1, 0))
+
+
+class ImportTest(TestCase):
+    def load(self, *records, **options):
+        lines = ''.join(json.dumps(record) + '\n' for record in records)
+        with mock.patch('sys.stdin', StringIO(lines)):
+            call_command('import_yatube', '-', stdout=StringIO(), **options)
+
+    def test_import_maps_ids_and_keeps_dates(self):
+        """import_yatube связывает записи по id выгрузки и сохраняет даты."""
+        User.objects.create_user(username='local')
+        recent.load()
+        self.load(
+            {'model': 'user', 'id': 1, 'username': 'imported1'},
+            {'model': 'user', 'id': 2, 'username': 'imported2'},
+            {'model': 'group', 'id': 5, 'title': 'Группа', 'slug': 'group',
+             'description': 'Описание'},
+            {'model': 'post', 'id': 10, 'author': 1, 'group': 5,
+             'text': 'Пост', 'pub_date': '2020-01-02T03:04:05+00:00'},
+            {'model': 'post', 'id': 11, 'author': 2, 'text': 'Без группы'},
+            {'model': 'comment', 'id': 20, 'post': 10, 'author': 2,
+             'text': 'Коммент'},
+            {'model': 'comment', 'id': 21, 'post': 99, 'author': 2,
+             'text': 'Без поста'},
+            {'model': 'follow', 'id': 30, 'user': 2, 'author': 1},
+            batch_size=1, transaction_size=2,
+        )
+        author = User.objects.get(username='imported1')
+        post = Post.objects.get(text='Пост')
+        self.assertEqual(post.author, author)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments_count, 1)
+        self.assertIsNone(Post.objects.get(text='Без группы').group)
+        self.assertFalse(Comment.objects.filter(text='Без поста').exists())
+        self.assertEqual(author.profile.posts_count, 1)
+        self.assertEqual(author.profile.followers_count, 1)
+        self.assertTrue(User.objects.create_user(username='next').pk)
+        self.assertTrue(FeedEntry.objects.filter(
+            user__username='imported2', post=post).exists())
+        self.assertIn(post.pk, [post_id for post_id, _ in recent.load()])
+
+    def test_import_errors_name_line(self):
+        """Лишнее поле и занятый slug останавливают загрузку с номером
+        строки."""
+        Group.objects.create(title='Группа', slug='taken')
+        with self.assertRaisesMessage(CommandError, 'Строка 1:'):
+            self.load({'model': 'user', 'id': 1, 'username': 'a', 'age': 3})
+        with self.assertRaisesMessage(CommandError, 'Строка 2:'):
+            self.load(
+                {'model': 'user', 'id': 1, 'username': 'a'},
+                {'model': 'group', 'id': 5, 'title': 'Дубль', 'slug': 'taken'},
+            )
+
+    def test_import_skip_existing(self):
+        """С --skip-existing занятые записи и ссылки на них пропускаются."""
+        User.objects.create_user(username='taken')
+        self.load(
+            {'model': 'user', 'id': 1, 'username': 'taken'},
+            {'model': 'user', 'id': 2, 'username': 'fresh'},
+            {'model': 'post', 'id': 10, 'author': 1, 'text': 'Чужой'},
+            {'model': 'post', 'id': 11, 'author': 2, 'text': 'Свой'},
+            {'model': 'follow', 'id': 30, 'user': 2, 'author': 1},
+            skip_existing=True,
+        )
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Свой'])
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(User.objects.filter(username='taken').count(), 1)
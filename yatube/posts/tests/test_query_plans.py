@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post
+from ..utils import NEXT, encode_cursor
+
+User = get_user_model()
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.author = User.objects.create_user(username='author_user')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовое описание',
+            slug='test_slug',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.author,
+            group=cls.group,
+        )
+        Comment.objects.create(
+            text='Тестовый коммент',
+            author=cls.user,
+            post=cls.post,
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def query_plans(self, url, params=None):
+        """Планы всех SELECT к таблицам posts, выполненных страницей."""
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url, params)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'posts_' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plans[sql] = [row[-1] for row in cursor.fetchall()]
+        return plans
+
+    def assertIndexedPlans(self, url, params=None):
+        plans = self.query_plans(url, params)
+        self.assertTrue(plans)
+        for sql, plan in plans.items():
+            with self.subTest(sql=sql):
+                for step in plan:
+                    self.assertNotIn('TEMP B-TREE', step)
+                    if step.startswith('SCAN'):
+                        self.assertIn('USING', step)
+
+    def test_list_views_use_indexes(self):
+        """Ленты и страница поста не сканируют таблицы и не сортируют."""
+        cursor = encode_cursor(
+            NEXT, [timezone.now().isoformat(), self.post.id + 1])
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            for params in (None, {'cursor': cursor}):
+                with self.subTest(url=url, params=params):
+                    self.assertIndexedPlans(url, params)
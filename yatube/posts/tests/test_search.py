@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import filter_posts, match_expression
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.cats = Post.objects.create(
+            text='Кот и коты <b>любят</b> котов', author=cls.user)
+        cls.cat = Post.objects.create(
+            text='Рыжий кот спит на диване, а собака гуляет', author=cls.user)
+        cls.dog = Post.objects.create(
+            text='Собака лает на прохожих', author=cls.user)
+        cls.hedgehogs = [
+            Post.objects.create(text=f'Ёжик номер {i}', author=cls.user)
+            for i in range(12)
+        ]
+        cls.client = Client()
+
+    def search(self, params):
+        return self.client.get(reverse('posts:search'), params)
+
+    def test_match_expression(self):
+        """Запрос превращается в префиксы основ слов."""
+        self.assertEqual(
+            match_expression('Котами "OR" собаки'),
+            '"кот"* "or"* "собак"*')
+
+    def test_search_ranks_and_highlights(self):
+        """Поиск ранжирует по BM25 и подсвечивает совпадения."""
+        response = self.search({'q': 'котами'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), [self.cats, self.cat])
+        self.assertIn('<mark>Кот</mark>', page_obj[0].snippet)
+        self.assertIn('&lt;b&gt;', page_obj[0].snippet)
+
+    def test_search_follows_edits(self):
+        """Индекс следует за правкой и удалением поста."""
+        self.dog.text = 'Попугай повторяет слова'
+        self.dog.save()
+        self.assertNotIn(
+            self.dog, self.search({'q': 'собака'}).context['page_obj'])
+        self.assertIn(
+            self.dog, self.search({'q': 'попугая'}).context['page_obj'])
+        Post.objects.filter(pk=self.cat.pk).delete()
+        self.assertEqual(
+            list(self.search({'q': 'собака'}).context['page_obj']), [])
+
+    def test_search_cursor_pagination(self):
+        """Результаты листаются по курсору без повторов."""
+        first_page = self.search({'q': 'ежик'}).context['page_obj']
+        second_page = self.search(
+            {'q': 'ежик', 'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertEqual(
+            set(first_page) | set(second_page), set(self.hedgehogs))
+        self.assertFalse(second_page.has_next())
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке использует тот же индекс."""
+        self.assertEqual(
+            set(filter_posts(Post.objects.all(), 'коты')),
+            {self.cats, self.cat})
@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Blob, Post
+from ..storage import content_storage
+from ..thumbnails import webp_name
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Тестовый текст',
+            author=self.user,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def refs(self, name):
+        return Blob.objects.get(name=name).refs
+
+    def collect(self):
+        call_command('collect_blobs', '--grace-hours=0', stdout=StringIO())
+
+    def test_same_upload_is_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом с двумя ссылками."""
+        first = self.create_post('first.gif')
+        files = content_storage.listdir('posts')[1]
+        second = self.create_post('second.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(content_storage.listdir('posts')[1], files)
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    def test_references_follow_edits_and_deletes(self):
+        """Ссылки переносятся при замене картинки и снимаются удалением."""
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00')
+        post.save()
+        self.assertEqual(self.refs(old_name), 0)
+        self.assertEqual(self.refs(post.image.name), 1)
+        post.delete()
+        self.assertEqual(self.refs(post.image.name), 0)
+
+    def test_collect_unreferenced_blobs(self):
+        """Сборщик удаляет только файлы без ссылок."""
+        kept = self.create_post()
+        content_storage.save_derived(
+            webp_name(kept.image.name), ContentFile(b'webp'))
+        dropped = self.create_post('other.gif', SMALL_GIF + b'\x00')
+        dropped_name = dropped.image.name
+        dropped.delete()
+        self.collect()
+        self.assertTrue(content_storage.exists(kept.image.name))
+        self.assertTrue(content_storage.exists(webp_name(kept.image.name)))
+        self.assertFalse(content_storage.exists(dropped_name))
+        self.assertFalse(Blob.objects.filter(name=dropped_name).exists())
+
+    def test_collect_sweeps_rows_without_files(self):
+        """Записи без ссылок и без файла удаляются порциями."""
+        kept = self.create_post()
+        Blob.objects.bulk_create(
+            Blob(name=f'posts/gone-{i}.gif') for i in range(3))
+        call_command('collect_blobs', '--grace-hours=0', '--batch-size=2',
+                     stdout=StringIO())
+        self.assertEqual(
+            list(Blob.objects.values_list('name', flat=True)),
+            [kept.image.name])
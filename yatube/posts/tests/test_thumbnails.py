@@ -0,0 +1,150 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .. import thumbnails
+from ..models import Post
+from ..templatetags.post_images import post_thumbnail
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        small_gif = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                     b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                     b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                     b'\x0A\x00\x3B')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=small_gif,
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Таблицу sorl откатывает TestCase, кеш и LRU — нет.
+        default.kvstore.cache.clear()
+        default.kvstore.forget(*default.kvstore._local)
+
+    def test_fallback_to_original(self):
+        """Пока миниатюры нет, шаблон получает оригинал и ставит задачу."""
+        with mock.patch.object(thumbnails, 'submit') as submit:
+            image = post_thumbnail(self.post)
+        self.assertEqual(image.url, self.post.image.url)
+        submit.assert_called_once_with(self.post.pk)
+
+    def test_generate_thumbnails(self):
+        """Генерация создаёт миниатюры и обновляет дату изменения."""
+        thumbnails.generate(self.post.pk)
+        variants = thumbnails.ready(self.post.image, 'card')
+        self.assertEqual(sorted(variants), [480, 720, 960])
+        self.assertEqual((variants[480].x, variants[480].y), (480, 170))
+        image = post_thumbnail(self.post)
+        self.assertEqual(image.url, variants[960].url)
+        self.assertIn(f'{variants[480].url} 480w', image.srcset)
+        self.assertGreater(
+            Post.objects.get(pk=self.post.pk).updated, self.post.updated)
+
+    def test_missing_image_is_not_queued(self):
+        """Для отсутствующего файла генерация не запускается."""
+        post = Post.objects.create(
+            text='Без файла', author=self.user, image='posts/missing.gif')
+        with mock.patch.object(thumbnails, 'submit') as submit:
+            image = post_thumbnail(post)
+        self.assertEqual(image.url, post.image.url)
+        submit.assert_not_called()
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_inline_generation(self):
+        """Без пула миниатюра создаётся прямо при выводе."""
+        image = post_thumbnail(self.post)
+        variants = thumbnails.ready(self.post.image, 'card')
+        self.assertEqual(image.url, variants[960].url)
+
+    def test_prefetch_thumbnails(self):
+        """Записи о миниатюрах страницы загружаются одним запросом к кешу."""
+        thumbnails.generate(self.post.pk)
+        kvstore = default.kvstore
+        kvstore.forget(*kvstore._local)
+        with mock.patch.object(
+                kvstore.cache, 'get_many',
+                wraps=kvstore.cache.get_many) as get_many:
+            thumbnails.prefetch([self.post, self.post])
+        get_many.assert_called_once()
+        with mock.patch.object(kvstore.cache, 'get') as get:
+            self.assertIsNotNone(thumbnails.ready(self.post.image, 'card'))
+        get.assert_not_called()
+
+    def test_lru_is_bounded(self):
+        """Локальный LRU не растёт больше THUMBNAIL_LRU_SIZE."""
+        with self.settings(THUMBNAIL_LRU_SIZE=2):
+            for key in 'abc':
+                default.kvstore._set_raw(add_prefix(key), key)
+        self.assertEqual(
+            list(default.kvstore._local), [add_prefix('b'), add_prefix('c')])
+        self.assertEqual(default.kvstore._get_raw(add_prefix('a')), 'a')
+
+    def test_migrate_kvstore(self):
+        """Команда загружает записи из таблицы sorl в кеш."""
+        key = add_prefix('old', 'thumbnails')
+        KVStoreModel.objects.create(key=key, value='["new"]')
+        call_command('migrate_thumbnail_kvstore', stdout=StringIO())
+        self.assertEqual(default.kvstore.cache.get(key), '["new"]')
+        self.assertTrue(KVStoreModel.objects.filter(key=key).exists())
+
+    def test_kvstore_survives_cache_eviction(self):
+        """Вытесненная из кеша запись читается из таблицы и перечисляется."""
+        thumbnails.generate(self.post.pk)
+        kvstore = default.kvstore
+        kvstore.forget(*kvstore._local)
+        kvstore.cache.clear()
+        self.assertIsNotNone(thumbnails.ready(self.post.image, 'card'))
+        self.assertTrue(kvstore._find_keys_raw(add_prefix('')))
+        kvstore.clear()
+        self.assertFalse(KVStoreModel.objects.exists())
+
+    def test_picture_offers_webp(self):
+        """WebP-копии миниатюр попадают в <source> элемента <picture>."""
+        thumbnails.generate(self.post.pk)
+        variants = thumbnails.ready(self.post.image, 'card')
+        for thumbnail in variants.values():
+            # Pillow может быть собран без WebP: копии кладём сами.
+            name = thumbnails.webp_name(thumbnail.name)
+            default.storage.delete(name)
+            default.storage.save(name, ContentFile(b'webp'))
+        webp = default.storage.url(thumbnails.webp_name(variants[480].name))
+        response = Client().get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'{webp} 480w')
+        self.assertContains(response, f'src="{variants[960].url}"')
@@ -1,15 +1,24 @@
+import hashlib
+import json
 import shutil
+import time
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
+from ..models import Comment, FeedEntry, Follow, Group, Post
+from ..utils import (NEXT, CursorPaginator, PageEntry, QueryBudgetExceeded,
+                     bump_page_versions, encode_cursor, needs_refresh,
+                     query_budget, sort)
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.TEST_DIR)
@@ -157,15 +166,58 @@ class ViewsTests(TestCase):
 
     def test_cache_index_page(self):
         """Проверка работы кэша"""
-        Post.objects.create(
+        post = Post.objects.create(
             author=self.user,
             text='Текст кэша',
         )
         response = self.authorized_client.get(reverse('posts:index'))
-        delete_post = response.content
-        Post.objects.filter(text='Текст кэша').delete()
+        cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertIsNone(cached.context)
+        self.assertEqual(response.content, cached.content)
+        post.delete()
         response = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(delete_post, response.content)
+        self.assertNotIn('Текст кэша', response.content.decode())
+
+    def test_post_fragment_cache(self):
+        """Карточка поста берётся из кэша до изменения поста."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        bump_page_versions('index')
+        response = self.authorized_client.get(url)
+        self.assertContains(response, self.post.text)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка через save'
+        post.save()
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Правка через save')
+
+    def test_post_fragment_follows_author(self):
+        """Карточка поста обновляется, когда автор меняет имя."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        User.objects.filter(pk=self.post.author_id).update(
+            first_name='Новое', last_name='Имя')
+        bump_page_versions('index')
+        self.assertContains(self.authorized_client.get(url), 'Новое Имя')
+
+    def test_cache_invalidated_by_scope(self):
+        """Новый пост сбрасывает кэш только своих страниц."""
+        other = User.objects.create_user(username='other_user')
+        urls = {
+            reverse('posts:index'): True,
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}): True,
+            reverse('posts:profile', kwargs={'username': self.user}): True,
+            reverse('posts:profile', kwargs={'username': other}): False,
+        }
+        for url in urls:
+            self.authorized_client.get(url)
+        Post.objects.create(
+            author=self.user, group=self.group, text='Свежий пост')
+        for url, changed in urls.items():
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.context is not None, changed)
 
 
 class PaginatorViewsTest(TestCase):
@@ -208,6 +260,48 @@ class PaginatorViewsTest(TestCase):
                     self.assertEqual(
                         len(response.context.get('page_obj')), count)
 
+    def test_cursor_paginator_on_pages(self):
+        """Проверка keyset-пагинации по курсору."""
+        url = reverse('posts:index')
+        first_page = self.cursor_page(
+            self.authorized_client, url, {'page': 1})
+        cursor = encode_cursor(NEXT, CursorPaginator(
+            Post.objects.all(), sort).key_values(first_page[-1]))
+        second_page = self.cursor_page(
+            self.authorized_client, url, {'cursor': cursor})
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(set(first_page).isdisjoint(second_page))
+        previous_page = self.cursor_page(
+            self.authorized_client, url,
+            {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_cursor_paginator_bad_token(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        post = Post.objects.latest('pub_date')
+        date = post.pub_date.isoformat()
+        tokens = [
+            'испорчен',
+            encode_cursor(NEXT, [date, 'abc']),
+            encode_cursor(NEXT, [date, [1]]),
+            encode_cursor(NEXT, [date, None]),
+            encode_cursor(NEXT, [1, post.pk]),
+            encode_cursor(NEXT, ['2020-01-01', post.pk]),
+        ]
+        for token in tokens:
+            with self.subTest(token=token):
+                response = self.cursor_page(
+                    self.authorized_client, reverse('posts:index'),
+                    {'cursor': token})
+                self.assertEqual(len(response), 10)
+
+    @staticmethod
+    def cursor_page(client, url, params):
+        cache.clear()
+        return client.get(url, params).context['page_obj']
+
 
 class FollowViewTest(TestCase):
     @classmethod
@@ -255,3 +349,477 @@ class FollowViewTest(TestCase):
         response = self.author_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(self.post, response.context['page_obj'].object_list)
+
+    def test_feed_entries_follow_subscriptions(self):
+        """Лента подписок заполняется при подписке и публикации."""
+        Follow.objects.create(user=self.follower, author=self.user)
+        new_post = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(user=self.follower).values_list(
+                'post', flat=True)),
+            [new_post.id, self.post.id])
+        self.follower_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.user}))
+        self.assertFalse(FeedEntry.objects.filter(user=self.follower))
+
+
+@override_settings(QUERY_BUDGET_ENFORCED=True)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Тестовая группа {i}',
+                description='Тестовое описание',
+                slug=f'test_slug_{i}',
+            ) for i in range(2)
+        ]
+        authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(3)
+        ]
+        posts = [
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=authors[i % len(authors)],
+                group=cls.groups[i % len(cls.groups)],
+            ) for i in range(15)
+        ]
+        cls.author = authors[0]
+        cls.post = posts[0]
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+            Comment.objects.create(
+                text='Тестовый коммент', author=author, post=cls.post)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_views_fit_query_budget(self):
+        """Страницы укладываются в бюджет запросов при любом числе постов."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    kwargs={'slug': self.groups[0].slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        for client in (self.guest_client, self.authorized_client):
+            for url in urls:
+                for page in (1, 2):
+                    with self.subTest(url=url, page=page):
+                        cache.clear()
+                        client.get(url, {'page': page})
+
+    @override_settings(FOLLOW_FEED_ENGINE='pull')
+    def test_pull_feed_fits_query_budget(self):
+        """Лента pull с холодным кэшем хронологий укладывается в бюджет."""
+        url = reverse('posts:follow_index')
+        for page in (1, 2):
+            with self.subTest(page=page):
+                cache.clear()
+                response = self.authorized_client.get(url, {'page': page})
+                self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_query_budget_exceeded(self):
+        """Превышение бюджета запросов приводит к ошибке."""
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'FROM'):
+            with query_budget(1):
+                list(Post.objects.all())
+                list(Group.objects.all())
+
+
+@override_settings(FOLLOW_FEED_ENGINE='pull', FEED_TIMELINE_LENGTH=2)
+class PullFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(3)
+        ]
+        for i in range(13):
+            Post.objects.create(
+                text=f'Тестовый текст {i}', author=authors[i % 3])
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_pull_feed_merges_timelines(self):
+        """Лента pull-движка совпадает с хронологией подписок."""
+        url = reverse('posts:follow_index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        second_page = self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(
+            list(first_page) + list(second_page), self.expected)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(FeedEntry.objects.exists())
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='export', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Текст, {i}', author=cls.author, group=cls.group)
+            for i in range(3)
+        ]
+        Post.objects.create(text='Чужой пост', author=cls.other)
+        Comment.objects.create(
+            text='Коммент', author=cls.other, post=cls.posts[0])
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def records(self, response):
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return [json.loads(line) for line in lines]
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_posts_ndjson(self):
+        """Выгрузка постов автора идёт по id и продолжается с after."""
+        url = reverse('posts:profile_export', args=['author', 'posts',
+                                                    'ndjson'])
+        records = self.records(self.client.get(url))
+        self.assertEqual(
+            [record['id'] for record in records],
+            [post.pk for post in self.posts])
+        self.assertEqual(records[0]['model'], 'post')
+        self.assertEqual(records[0]['group'], self.group.pk)
+        records = self.records(
+            self.client.get(url, {'after': self.posts[0].pk}))
+        self.assertEqual(
+            [record['id'] for record in records],
+            [post.pk for post in self.posts[1:]])
+
+    def test_export_group_comments_csv(self):
+        """Комментарии группы выгружаются в CSV с заголовком."""
+        url = reverse('posts:group_export', args=['export', 'comments',
+                                                  'csv'])
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,post,author,text,created')
+        self.assertEqual(len(lines), 2)
+
+    def test_export_access(self):
+        """Гостя отправляют на вход, чужие данные — только персоналу."""
+        url = reverse('posts:profile_export', args=['other', 'posts',
+                                                    'ndjson'])
+        group_url = reverse('posts:group_export', args=['export', 'posts',
+                                                        'ndjson'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(group_url).status_code, 403)
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertRedirects(response, f'/auth/login/?next={url}')
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_export_unknown_format(self):
+        """Неизвестный формат выгрузки — 404."""
+        url = reverse('posts:profile_export', args=['author', 'posts',
+                                                    'xml'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_export_command_round_trips_import(self):
+        """NDJSON из export_yatube читается import_yatube."""
+        out = StringIO()
+        call_command('export_yatube', 'posts', author='other', stdout=out)
+        Post.objects.filter(author=self.other).delete()
+        lines = ('{"model": "user", "id": %d, "username": "copy"}\n'
+                 % self.other.pk) + out.getvalue()
+        with mock.patch('sys.stdin', StringIO(lines)):
+            call_command('import_yatube', '-', stdout=StringIO())
+        self.assertTrue(Post.objects.filter(
+            text='Чужой пост', author__username='copy').exists())
+
+
+class ConditionalViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='conditional',
+            description='Описание')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        # С кукой запрос минует полностраничный кэш для гостей.
+        self.client.cookies['visited'] = '1'
+        self.urls = [
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        ]
+
+    def test_not_modified_without_rendering(self):
+        """Неизменная страница отдаёт 304 без шаблонов.
+
+        Странице поста нужен один запрос за автором и группой,
+        остальным — ни одного.
+        """
+        for url, queries in zip(self.urls, (1, 0, 0)):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_etag_follows_changes(self):
+        """ETag меняется с комментарием, подпиской, группой и пользователем."""
+        changes = [
+            lambda: Comment.objects.create(
+                text='Коммент', author=self.user, post=self.post),
+            lambda: Group.objects.filter(pk=self.group.pk).get().save(),
+            lambda: Follow.objects.create(user=self.user, author=self.author),
+        ]
+        for url, change in zip(self.urls, changes):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                change()
+                self.assertNotEqual(self.client.get(url)['ETag'], etag)
+        etag = self.client.get(self.urls[0])['ETag']
+        self.author.first_name = 'Писатель'
+        self.author.save()
+        self.assertNotEqual(self.client.get(self.urls[0])['ETag'], etag)
+        client = Client()
+        client.force_login(self.user)
+        url = self.urls[0]
+        self.assertNotEqual(
+            client.get(url)['ETag'], self.client.get(url)['ETag'])
+
+    def test_comment_delete_changes_last_modified(self):
+        """Удаление комментария не даёт 304 клиенту с If-Modified-Since."""
+        comment = Comment.objects.create(
+            text='Удаляемый коммент', author=self.user, post=self.post)
+        urls = [
+            self.urls[0],
+            reverse('posts:comments', args=[self.post.pk]),
+        ]
+        modified = {url: self.client.get(url)['Last-Modified'] for url in urls}
+        with mock.patch('posts.utils.time.time',
+                        return_value=time.time() + 10):
+            comment.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=modified[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, 'Удаляемый коммент')
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        cls.comments = [
+            Comment.objects.create(
+                text=f'Коммент {i}', author=cls.user, post=cls.post)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста только первая порция новых комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:-3:-1])
+        self.assertContains(
+            response, reverse('posts:comments', args=[self.post.pk]))
+
+    def test_fragment_loads_rest(self):
+        """Фрагмент по курсору отдаёт следующие порции до конца."""
+        url = reverse('posts:comments', args=[self.post.pk])
+        cursor = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments'].next_cursor
+        loaded = []
+        while cursor:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateUsed(response, 'includes/comments.html')
+            loaded.extend(response.context['comments'])
+            cursor = response.context['comments'].next_cursor
+        self.assertEqual(loaded, self.comments[2::-1])
+
+
+class PageStampedeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:index')
+        path = hashlib.md5(self.url.encode()).hexdigest()
+        self.lock = f'page:{path}:0:lock'
+
+    def test_stale_copy_while_locked(self):
+        """Пока страницу пересобирает другой запрос, отдаётся старая копия."""
+        self.client.get(self.url)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        cache.add(self.lock, 1)
+        response = self.client.get(self.url)
+        self.assertIsNone(response.context)
+        self.assertNotContains(response, 'Свежий пост')
+        cache.delete(self.lock)
+        self.assertContains(self.client.get(self.url), 'Свежий пост')
+        self.assertFalse(cache.has_key(self.lock))
+
+    def test_stale_copy_keeps_its_etag(self):
+        """Старая копия уходит со своим ETag, и после пересборки
+        клиент с ним получает новую страницу, а не 304."""
+        group = Group.objects.create(
+            title='Группа', slug='stale', description='Описание')
+        url = reverse('posts:group_list', args=[group.slug])
+        path = hashlib.md5(url.encode()).hexdigest()
+        member = Client()
+        # С кукой запрос минует полностраничный кэш для гостей.
+        member.cookies['visited'] = '1'
+        for client in (self.client, member):
+            with self.subTest(visited='visited' in client.cookies):
+                cache.clear()
+                etag = client.get(url)['ETag']
+                post = Post.objects.create(
+                    text='Свежий пост', author=self.user, group=group)
+                cache.add(f'page:{path}:0:lock', 1)
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertNotContains(response, 'Свежий пост')
+                self.assertEqual(response['ETag'], etag)
+                self.assertFalse(response.has_header('Last-Modified'))
+                cache.delete(f'page:{path}:0:lock')
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'Свежий пост')
+                post.delete()
+
+    @override_settings(PAGE_CACHE_WAIT=0.1)
+    def test_cold_cache_waits_then_renders(self):
+        """Без копии запрос ждёт сборщика, а не дождавшись — собирает сам."""
+        cache.add(self.lock, 1)
+        response = self.client.get(self.url)
+        self.assertIsNotNone(response.context)
+
+    def test_early_refresh(self):
+        """Раннее обновление срабатывает тем раньше, чем больше beta."""
+        entry = PageEntry([1], time.time() + 60, 1.0, None)
+        self.assertFalse(needs_refresh(entry, [1], 0))
+        self.assertTrue(needs_refresh(entry, [2], 0))
+        with mock.patch('posts.utils.random.random', return_value=0.5):
+            self.assertFalse(needs_refresh(entry, [1], 1))
+            self.assertTrue(needs_refresh(entry, [1], 100))
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail', args=[self.post.pk])
+
+    def test_second_request_served_from_cache(self):
+        """Повторный запрос гостя отдаётся из кэша без обращений к БД."""
+        response = self.client.get(self.url)
+        self.assertIsNotNone(response.context)
+        self.assertIn(f'post:{self.post.pk}', response['Surrogate-Key'])
+        self.assertIn('author:author', response['Surrogate-Key'])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Тестовый пост')
+
+    def test_not_modified_from_cache(self):
+        """If-None-Match к закэшированной странице получает 304."""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_tagged_pages(self):
+        """Комментарий сбрасывает страницу поста, но не чужой профиль."""
+        profile = reverse('posts:profile', args=['other'])
+        self.client.get(self.url)
+        self.client.get(profile)
+        Comment.objects.create(
+            text='Новый коммент', author=self.other, post=self.post)
+        self.assertContains(self.client.get(self.url), 'Новый коммент')
+        self.assertIsNone(self.client.get(profile).context)
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        self.assertContains(self.client.get(self.url), 'Исправленный текст')
+
+    def test_group_edit_invalidates_only_its_pages(self):
+        """Правка группы сбрасывает её страницы, но не всю ленту."""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.create(text='Пост группы', author=self.other, group=group)
+        group_url = reverse('posts:group_list', args=['group'])
+        index = reverse('posts:index')
+        for url in (group_url, index):
+            self.client.get(url)
+        group.description = 'Новое описание'
+        group.save()
+        self.assertContains(self.client.get(group_url), 'Новое описание')
+        self.assertIsNone(self.client.get(index).context)
+
+    def test_author_rename_invalidates_pages(self):
+        """Смена имени автора сбрасывает ленты с его постами."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=['author']),
+            self.url,
+        )
+        for url in urls:
+            self.client.get(url)
+        self.user.first_name = 'Новое'
+        self.user.last_name = 'Имя'
+        self.user.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.client.get(url).context)
+
+    def test_requests_with_cookies_bypass_cache(self):
+        """Запросы с куками и пользователи получают свежую сборку."""
+        self.client.get(self.url)
+        self.client.cookies['visited'] = '1'
+        self.assertIsNotNone(self.client.get(self.url).context)
+        self.client.force_login(self.user)
+        self.assertIsNotNone(self.client.get(self.url).context)
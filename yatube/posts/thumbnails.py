@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+from .utils import bump_page_versions
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, которые используют шаблоны: тег post_thumbnail принимает
+# только имя отсюда, поэтому очередь генерации не отстаёт от шаблонов.
+# Для srcset каждый размер режется ещё и на меньшие ширины.
+GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+WIDTHS = (480, 720, 960)
+SIZES = {
+    'card': '(max-width: 992px) 100vw, 960px',
+}
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+
+def workers():
+    return getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру, не создавая её."""
+
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры с тем именем, которое дал бы get_thumbnail."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.get_thumbnail_file(file_, geometry_string, **options))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def webp_name(name):
+    return f'{os.path.splitext(name)[0]}.webp'
+
+
+def variants(size):
+    """Геометрии размера для всех ширин srcset, от узкой к широкой."""
+    geometry, options = GEOMETRIES[size]
+    width, height = (int(side) for side in geometry.split('x'))
+    return [
+        (variant, f'{variant}x{round(height * variant / width)}', options)
+        for variant in WIDTHS if variant <= width
+    ]
+
+
+def ready(image, size):
+    """Готовые миниатюры по ширинам или None, если готовы не все."""
+    thumbnails = {}
+    for width, geometry, options in variants(size):
+        thumbnail = backend.get_ready_thumbnail(image, geometry, **options)
+        if thumbnail is None:
+            return None
+        thumbnails[width] = thumbnail
+    return thumbnails
+
+
+def prefetch(posts):
+    """Одним запросом загружает записи о миниатюрах всех постов."""
+    if not hasattr(default.kvstore, 'prefetch'):
+        return
+    default.kvstore.prefetch([
+        backend.get_thumbnail_file(post.image, geometry, **options)
+        for post in posts if post.image
+        for size in GEOMETRIES
+        for _, geometry, options in variants(size)
+    ])
+
+
+def write_webp(thumbnail):
+    """Кладёт рядом с JPEG-миниатюрой её WebP-копию."""
+    name = webp_name(thumbnail.name)
+    if not features.check('webp') or default.storage.exists(name):
+        return
+    with default.storage.open(thumbnail.name, 'rb') as source:
+        with Image.open(source) as image:
+            buffer = BytesIO()
+            image.save(buffer, 'WEBP', quality=thumbnail_settings
+                       .THUMBNAIL_QUALITY, method=6)
+    default.storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def source_exists(image):
+    try:
+        return image.storage.exists(image.name)
+    except (OSError, SuspiciousFileOperation):
+        return False
+
+
+def create(image):
+    """Создаёт миниатюры всех размеров; True, если все они готовы."""
+    for size in GEOMETRIES:
+        for _, geometry, options in variants(size):
+            thumbnail = backend.get_thumbnail(image, geometry, **options)
+            if thumbnail.exists():
+                write_webp(thumbnail)
+    return all(ready(image, size) for size in GEOMETRIES)
+
+
+def generate(post_id):
+    """Создаёт миниатюры поста и сбрасывает кеши, где мог остаться
+    оригинал."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id).first()
+    if post is None or not post.image or not create(post.image):
+        return
+    Post.objects.filter(pk=post_id).update(updated=timezone.now())
+    from .signals import post_page_scopes
+    bump_page_versions(*post_page_scopes(post))
+
+
+def run(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры поста %s', post_id)
+    finally:
+        with _lock:
+            _pending.discard(post_id)
+        if workers():
+            close_old_connections()
+
+
+def submit(post_id):
+    global _executor
+    with _lock:
+        if post_id in _pending:
+            return
+        _pending.add(post_id)
+        if workers() and _executor is None:
+            _executor = ThreadPoolExecutor(
+                workers(), thread_name_prefix='thumbnails')
+    if workers():
+        _executor.submit(run, post_id)
+    else:
+        run(post_id)
+
+
+def enqueue(post):
+    """Ставит генерацию миниатюр в очередь после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(lambda: submit(post.pk))
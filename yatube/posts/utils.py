@@ -1,26 +1,395 @@
+import base64
+import binascii
+import hashlib
+import json
+import math
+import random
+import time
+from collections.abc import Sequence
+from datetime import datetime
 from functools import wraps
+from http import HTTPStatus
+from typing import NamedTuple
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.decorators import available_attrs
-from django.views.decorators.cache import cache_page
+
+from core.routers import use_primary
 
 sort = 10  # Сортировка кол-ва записей
+shallow_pages = 5  # Глубина пагинации по номерам страниц
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для испорченного токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPage(Sequence):
+    """Страница keyset-пагинации без COUNT(*) и OFFSET."""
+
+    cursor_mode = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по убыванию ключа (по умолчанию (pub_date, id))."""
 
+    def __init__(self, object_list, per_page, key=('pub_date', 'id')):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.key = key
 
-def paginator(post_list, request):
+    def key_values(self, obj):
+        values = []
+        for field in self.key:
+            value = getattr(obj, field)
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def parse_values(self, values):
+        """Значения ключа из курсора или None, если курсор испорчен."""
+        if len(values) != len(self.key):
+            return None
+        parsed = []
+        for field, value in zip(self.key, values):
+            model_field = self.object_list.model._meta.get_field(field)
+            try:
+                value = model_field.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                return None
+            if value is None or (settings.USE_TZ
+                                 and isinstance(value, datetime)
+                                 and timezone.is_naive(value)):
+                return None
+            parsed.append(value)
+        return parsed
+
+    def boundary(self, values, lookup):
+        """Условие «строго после ключа» в порядке сортировки."""
+        leading = Q(**{f'{self.key[0]}__{lookup}e': values[0]})
+        condition = Q()
+        for position in reversed(range(len(self.key))):
+            field = self.key[position]
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            if condition:
+                step |= Q(**{field: values[position]}) & condition
+            condition = step
+        return leading & condition
+
+    def get_page(self, token=None):
+        cursor = decode_cursor(token) if token else None
+        values = self.parse_values(cursor[1]) if cursor else None
+        descending = [f'-{field}' for field in self.key]
+        if values is None:
+            direction = NEXT
+            queryset = self.object_list.order_by(*descending)
+        elif cursor[0] == NEXT:
+            direction = NEXT
+            queryset = self.object_list.filter(
+                self.boundary(values, 'lt')).order_by(*descending)
+        else:
+            direction = PREVIOUS
+            queryset = self.object_list.filter(
+                self.boundary(values, 'gt')).order_by(*self.key)
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows)
+        has_next = has_more if direction == NEXT else True
+        has_previous = values is not None and (
+            direction == NEXT or has_more)
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor(
+                NEXT, self.key_values(rows[-1])) if has_next else None,
+            previous_cursor=encode_cursor(
+                PREVIOUS, self.key_values(rows[0])) if has_previous else None,
+        )
+
+
+def paginator(post_list, request, key=('pub_date', 'id')):
+    token = request.GET.get('cursor')
+    if token:
+        return CursorPaginator(post_list, sort, key).get_page(token)
+    post_list = post_list.order_by(*[f'-{field}' for field in key])
     paginator = Paginator(post_list, sort)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.shallow_range = range(
+        1, min(paginator.num_pages, shallow_pages) + 1)
+    if page_obj.has_next() and page_obj.number >= shallow_pages:
+        page_obj.next_cursor = encode_cursor(
+            NEXT, CursorPaginator(post_list, sort, key).key_values(
+                page_obj[-1]))
     return page_obj
 
 
-def cache_on_auth(timeout):
+def page_version_key(scope):
+    return f'page_version:{scope}'
+
+
+def page_versions(scopes):
+    """Текущие версии областей кэша страниц.
+
+    Пропавшая версия заводится заново от текущего времени, чтобы не
+    совпасть ни с одной из выданных раньше.
+    """
+    keys = [page_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def page_changed_key(scope):
+    return f'page_changed:{scope}'
+
+
+def page_changed(scopes):
+    """Время последней смены любой из областей (для Last-Modified).
+
+    Пропавшая отметка считается текущим временем: раньше её нельзя.
+    """
+    keys = [page_changed_key(scope) for scope in scopes]
+    changed = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in changed:
+            cache.add(key, now, None)
+            changed[key] = now
+    return max(changed.values(), default=None)
+
+
+def bump_page_versions(*scopes):
+    for scope in scopes:
+        key = page_version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    now = time.time()
+    cache.set_many(
+        {page_changed_key(scope): now for scope in scopes}, None)
+
+
+def add_surrogate_keys(request, *scopes, versions=None):
+    """Помечает ответ областями кэша, от которых он зависит.
+
+    Версии снимаются до чтения данных страницы; по ним
+    AnonymousPageCacheMiddleware понимает, что копия устарела.
+    """
+    if versions is None:
+        versions = page_versions(scopes)
+    keys = getattr(request, 'surrogate_keys', {})
+    keys.update(zip(scopes, versions))
+    request.surrogate_keys = keys
+
+
+def surrogate_keys(*scopes):
+    """Декоратор для add_surrogate_keys с областями из аргументов вьюхи."""
+    def decorator(view_func):
+        @wraps(view_func, assigned=available_attrs(view_func))
+        def _wrapped_view(request, *args, **kwargs):
+            add_surrogate_keys(
+                request, *(scope.format(**kwargs) for scope in scopes))
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
+
+
+class PageEntry(NamedTuple):
+    versions: list
+    expires: float
+    delta: float
+    response: object
+
+
+def needs_refresh(entry, versions, beta):
+    """Пора ли пересобрать страницу.
+
+    Кроме смены версии и истечения срока — вероятностное раннее
+    обновление (XFetch): чем дольше страница собиралась и чем ближе
+    срок, тем вероятнее, что очередной запрос обновит её заранее.
+    """
+    if entry.versions != versions:
+        return True
+    now = time.time()
+    if beta:
+        now -= entry.delta * beta * math.log(1 - random.random())
+    return now >= entry.expires
+
+
+def wait_for_page(key):
+    """Ждёт страницу, которую уже собирает другой запрос."""
+    deadline = time.monotonic() + getattr(settings, 'PAGE_CACHE_WAIT', 2)
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def store_page(key, versions, timeout, render):
+    started = time.monotonic()
+    with use_primary():
+        response = render()
+    if response.status_code == HTTPStatus.OK:
+        ttl = timeout or getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+        entry = PageEntry(
+            versions, time.time() + ttl, time.monotonic() - started,
+            response)
+        # Копия живёт дольше срока: её отдают, пока пересобирается новая.
+        cache.set(key, entry, ttl + getattr(
+            settings, 'PAGE_CACHE_STALE', 60 * 60))
+    return response
+
+
+def cache_on_version(*scopes, timeout=None, beta=None):
+    """Кэширует GET-ответ вьюхи до смены версии одной из областей.
+
+    Области — строки, подставляемые из аргументов вьюхи, например
+    'group:{slug}'. Ключ учитывает полный путь и пользователя.
+
+    Пересобирает страницу один запрос под блокировкой в кэше, остальные
+    тем временем получают прежнюю копию, а при пустом кэше ждут её.
+    ``beta`` — коэффициент раннего обновления, 0 его отключает.
+    """
     def decorator(view_func):
         @wraps(view_func, assigned=available_attrs(view_func))
         def _wrapped_view(request, *args, **kwargs):
-            result = cache_page(
-                timeout,
-                key_prefix=(f"_auth_{request.user.is_authenticated}_"))
-            return result(view_func)(request, *args, **kwargs)
+            if request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+            names = [scope.format(**kwargs) for scope in scopes]
+            versions = page_versions(names)
+            add_surrogate_keys(request, *names, versions=versions)
+            path = hashlib.md5(
+                request.get_full_path().encode()).hexdigest()
+            key = f'page:{path}:{request.user.pk or 0}'
+            entry = cache.get(key)
+            early = beta
+            if early is None:
+                early = getattr(settings, 'PAGE_CACHE_BETA', 1)
+            if entry is not None and not needs_refresh(
+                    entry, versions, early):
+                return entry.response
+            lock = f'{key}:lock'
+            locked = cache.add(
+                lock, 1, getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 30))
+            if not locked:
+                if entry is None:
+                    entry = wait_for_page(key)
+                if entry is not None:
+                    # Копия может быть старой: помечаем её версиями,
+                    # чтобы полностраничный кэш и conditional не приняли
+                    # её за свежую.
+                    add_surrogate_keys(
+                        request, *names, versions=entry.versions)
+                    request.stale_versions = dict(
+                        zip(names, entry.versions))
+                    return entry.response
+            try:
+                return store_page(
+                    key, versions, timeout,
+                    lambda: view_func(request, *args, **kwargs))
+            finally:
+                if locked:
+                    cache.delete(lock)
         return _wrapped_view
     return decorator
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class query_budget:
+    """Ограничение числа SQL-запросов.
+
+    Как контекстный менеджер проверяет блок всегда, как декоратор
+    вьюхи — только при settings.QUERY_BUDGET_ENFORCED. Запросы считает
+    обёртка execute_wrapper, без отладочного курсора и django.test.
+    """
+
+    def __init__(self, limit, using=DEFAULT_DB_ALIAS):
+        self.limit = limit
+        self.using = using
+
+    def __enter__(self):
+        self.queries = []
+        self.wrapper = connections[self.using].execute_wrapper(self.count)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wrapper.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.queries) > self.limit:
+            queries = '\n'.join(self.queries)
+            raise QueryBudgetExceeded(
+                f'{len(self.queries)} запросов при лимите {self.limit}:'
+                f'\n{queries}')
+
+    def count(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __call__(self, view_func):
+        @wraps(view_func, assigned=available_attrs(view_func))
+        def _wrapped_view(request, *args, **kwargs):
+            if not getattr(settings, 'QUERY_BUDGET_ENFORCED', False):
+                return view_func(request, *args, **kwargs)
+            with query_budget(self.limit, self.using):
+                return view_func(request, *args, **kwargs)
+        _wrapped_view.query_budget = self.limit
+        return _wrapped_view
@@ -1,14 +1,28 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_safe
+
+from core.routers import read_from_replica
 
+from . import exports, feeds, images, search
+from .conditional import conditional
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .utils import cache_on_auth, paginator
+from .utils import (CursorPaginator, add_surrogate_keys,
+                    cache_on_version, paginator, query_budget,
+                    surrogate_keys)
 
 
-@cache_on_auth(20)
+@read_from_replica
+@cache_on_version('index', 'groups')
+@query_budget(4)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_listing()
     page_obj = paginator(post_list, request)
     context = {
         'page_obj': page_obj,
@@ -16,9 +30,13 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@conditional('group:{slug}', per_user=True)
+@cache_on_version('group:{slug}')
+@query_budget(5)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_listing()
     page_obj = paginator(post_list, request)
     context = {
         'group': group,
@@ -27,11 +45,17 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@conditional('author:{username}', 'groups', per_user=True)
+@cache_on_version('author:{username}', 'groups')
+@query_budget(6)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    post_list = author.posts.for_listing()
     page_obj = paginator(post_list, request)
-    following = author.following.all().exists()
+    following = request.user.is_authenticated and author.following.filter(
+        user=request.user).exists()
     context = {
         'author': author,
         'page_obj': page_obj,
@@ -40,9 +64,32 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def post_scopes(request, post_id):
+    """Области страницы поста: сам пост, его автор и группа."""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if row is None:
+        return [f'post:{post_id}']
+    username, slug = row
+    scopes = [f'post:{post_id}', f'author:{username}']
+    if slug:
+        scopes.append(f'group:{slug}')
+    return scopes
+
+
+@read_from_replica
+@conditional(post_scopes, per_user=True)
+@surrogate_keys('post:{post_id}')
+@query_budget(4)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        id=post_id)
+    # Число постов автора в шапке меняется вместе с его страницей.
+    add_surrogate_keys(request, f'author:{post.author.username}')
+    if post.group_id:
+        add_surrogate_keys(request, f'group:{post.group.slug}')
+    comments = comments_page(post, request)
     form = CommentForm()
     context = {
         'form': form,
@@ -52,6 +99,70 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(post, request):
+    """Порция комментариев поста от курсора, новые первыми."""
+    comments = post.comments.select_related('author').only(
+        'post', 'text', 'created', 'author__username')
+    return CursorPaginator(
+        comments, getattr(settings, 'COMMENTS_PER_PAGE', 20),
+        key=('created', 'id')).get_page(request.GET.get('cursor'))
+
+
+@require_safe
+@conditional('post:{post_id}')
+def post_comments(request, post_id):
+    """HTML-фрагмент со следующей порцией комментариев для «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(post, request),
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+@query_budget(4)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search.search_page(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': f'{urlencode({"q": query})}&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@require_safe
+@login_required
+def export(request, kind, format, username=None, slug=None):
+    """Потоковая выгрузка постов или комментариев автора либо группы.
+
+    Свои записи выгружает автор, чужие и группы — только персонал.
+    ``?after=<id>`` продолжает прерванную выгрузку с последней
+    полученной записи.
+    """
+    if not (request.user.is_staff or username == request.user.username):
+        raise PermissionDenied
+    if kind not in exports.FIELDS or format not in exports.FORMATS:
+        raise Http404
+    after = request.GET.get('after')
+    if after is not None and not after.isdigit():
+        raise Http404
+    author = group = None
+    if username is not None:
+        author = get_object_or_404(User, username=username)
+    if slug is not None:
+        group = get_object_or_404(Group, slug=slug)
+    records = exports.queryset(kind, author=author, group=group)
+    response = StreamingHttpResponse(
+        exports.stream(kind, format, records, after),
+        content_type=exports.FORMATS[format])
+    name = username or slug
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}-{kind}.{format}"')
+    return response
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -60,7 +171,9 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
+        images.measure(post, form.cleaned_data['image'])
         post.save()
+        images.enqueue(post)
         return redirect('posts:profile', post.author)
     context = {
         'form': form
@@ -78,7 +191,11 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post)
     if form.is_valid():
+        if 'image' in form.changed_data:
+            images.measure(post, form.cleaned_data['image'])
         form.save()
+        if 'image' in form.changed_data:
+            images.enqueue(post)
         return redirect('posts:post_detail', post.id)
     context = {
         'form': form,
@@ -99,10 +216,11 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_from_replica
 @login_required
+@query_budget(4)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(post_list, request)
+    page_obj = feeds.follow_page(request)
     context = {
         'page_obj': page_obj
     }
@@ -42,6 +42,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CacheGenerationMiddleware',
+    'core.middleware.ReplicaMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -83,6 +86,24 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения — копии основной базы, которые периодически
+# обновляет manage.py sync_replicas; в тестах это та же база.
+# Вьюхи под core.routers.read_from_replica читают с них, а после записи
+# пользователь REPLICA_LAG секунд читает с основной, поэтому
+# синхронизировать реплики нужно чаще.
+DATABASE_REPLICAS = [
+    f'replica_{number}'
+    for number in range(1, config('DB_REPLICAS', default=0, cast=int) + 1)
+]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_LAG = config('REPLICA_LAG', default=5, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -136,10 +157,92 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Общий для всех воркеров кэш в SQLite (core.cache.SQLiteCache) с L1
+# в памяти процесса (core.cache.TieredCache);
+# при отладке и в тестах — память процесса, чтобы не тащить состояние
+# между запусками
+SHARED_CACHE = config('SHARED_CACHE', default=not DEBUG, cast=bool)
+CACHE_DIR = config('CACHE_DIR', default=os.path.join(BASE_DIR, 'cache'))
+
+if SHARED_CACHE:
+    CACHES = {
+        # Версии страниц читаются из памяти процесса, остальное — из
+        # общего кэша; сброс L1 рассылается через счётчик поколений
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_PREFIXES': ['page_version:'],
+                'L1_SIZE': 1000,
+                'L1_TIMEOUT': 60,
+            },
+        },
+        'shared': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'default.sqlite3'),
+            'OPTIONS': {'MAX_SIZE': 256 * 1024 * 1024},
+        },
+        'thumbnails': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'thumbnails.sqlite3'),
+            'OPTIONS': {'MAX_SIZE': 64 * 1024 * 1024},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'thumbnails': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'thumbnails',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
     }
-}
 
 TEST_DIR = os.path.join(BASE_DIR, 'tmp')
+
+QUERY_BUDGET_ENFORCED = config('QUERY_BUDGET_ENFORCED', default=False, cast=bool)
+
+FEED_FANOUT_BATCH_SIZE = 1000
+
+# Движок ленты подписок: fanout, pull или join
+FOLLOW_FEED_ENGINE = config('FOLLOW_FEED_ENGINE', default='fanout')
+FEED_TIMELINE_LENGTH = 100
+FEED_TIMELINE_TIMEOUT = 60 * 60
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Полностраничный кэш для гостей без кук; сбрасывается по surrogate-ключам
+ANONYMOUS_PAGE_TIMEOUT = 60 * 60 * 24
+# Устаревшую копию страницы отдают ещё столько, пока её пересобирает
+# один запрос; блокировка пересборки живёт не дольше LOCK_TIMEOUT,
+# а без копии остальные ждут её до PAGE_CACHE_WAIT секунд.
+PAGE_CACHE_STALE = 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+PAGE_CACHE_WAIT = 2
+# Коэффициент вероятностного раннего обновления (XFetch), 0 — выключить
+PAGE_CACHE_BETA = 1.0
+
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_CACHE = 'thumbnails'
+THUMBNAIL_LRU_SIZE = 1000
+
+# Потоки для генерации миниатюр; 0 — генерировать прямо в запросе
+# (по умолчанию при отладке, чтобы тесты не гонялись с пулом)
+THUMBNAIL_WORKERS = config(
+    'THUMBNAIL_WORKERS', default=0 if DEBUG else 2, cast=int)
+
+# Обработка загруженных картинок: процессы (0 — прямо после запроса),
+# предельная сторона в пикселях и качество JPEG/WebP
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=0 if DEBUG else 2, cast=int)
+IMAGE_MAX_SIZE = 2048
+IMAGE_QUALITY = 85
+
+# Сколько строк выгрузки читать из базы за раз
+EXPORT_CHUNK_SIZE = 2000
+
+# Комментариев на странице поста и в одной порции «Показать ещё»
+COMMENTS_PER_PAGE = 20
+
+# Сколько свежих постов держать в кэше для опроса «есть ли новые»
+RECENT_POSTS_LENGTH = 200